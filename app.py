@@ -1,3 +1,4 @@
+import logging
 from flask import Flask
 from src.logic.config import Config
 from src.routes.routes import main_bp
@@ -9,5 +10,11 @@ app.config.from_object(Config)
 app.register_blueprint(main_bp)
 app.register_blueprint(auth_bp)
 
+# Generation debug log (inputs such as the derived invalid_slots), only when configured
+if Config.GENERATION_DEBUG_LOG:
+    generation_logger = logging.getLogger('src.routes')
+    generation_logger.setLevel(logging.DEBUG)
+    generation_logger.addHandler(logging.FileHandler(Config.GENERATION_DEBUG_LOG))
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,288 @@
+"""
+Benchmark harness for the timetable generator.
+
+Builds synthetic schools (classes sharing a pool of teachers, random teacher
+unavailability, a daily break), generates every class the way
+perform_school_generation does, and reports per scenario:
+wall time, candidates/sec, feasibility rate, best / median school score and
+peak memory. Results are written as JSON so runs of two versions can be compared.
+
+Usage (from the project root):
+    python experiments/benchmark.py --scenarios small,medium --repeats 5 --output bench.json
+    python experiments/benchmark.py --compare bench.json          # re-run and diff against a file
+    python experiments/benchmark.py --classes 8 --subjects 9 --periods 7 --conflict-density 0.3
+    python experiments/benchmark.py --rules rules.json            # a school's rule settings, as POST /rules
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Add the project root to the path so we can import 'src'
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src.logic.algorithms import ENGINES, generate_schedule
+from src.logic.encoding import DAYS
+from src.logic.model import ProblemModel
+from src.logic.rules import blocked_slots, day_limit, effective_credits, resolve_rules
+from src.utils import metrics
+
+# Synthetic workloads. credits is the (min, max) weekly lectures per subject,
+# periods the lectures per day (a break slot is added in the middle) and
+# conflict_density the share of each teacher's slots blocked by outside commitments.
+SCENARIOS = {
+    'small': dict(classes=2, subjects=6, credits=(3, 4), periods=6, teachers=8, conflict_density=0.05),
+    'medium': dict(classes=6, subjects=8, credits=(3, 5), periods=8, teachers=20, conflict_density=0.1),
+    'large': dict(classes=12, subjects=10, credits=(3, 6), periods=10, teachers=35, conflict_density=0.15),
+    'tight': dict(classes=6, subjects=8, credits=(4, 6), periods=7, teachers=12, conflict_density=0.3),
+}
+
+
+def make_school(classes, subjects, credits, periods, teachers, conflict_density, seed=0):
+    """
+    Returns a synthetic school:
+    {'timeslots', 'break_slots', 'teacher_busy': {teacher: set((day, slot))},
+     'classes': [{'name', 'subjects', 'credits', 'priorities', 'teachers'}]}
+    """
+    rng = random.Random(seed)
+    half = periods // 2
+    timeslots = [f"{8 + i:02d}:00:00" for i in range(periods + 1)]
+    break_slots = [timeslots[half]]
+    lecture_slots = [t for t in timeslots if t not in break_slots]
+
+    teacher_busy = {
+        t: {(day, slot) for day in DAYS for slot in lecture_slots if rng.random() < conflict_density}
+        for t in range(teachers)
+    }
+
+    school_classes = []
+    for k in range(classes):
+        names = [f"C{k}-S{i}" for i in range(subjects)]
+        school_classes.append({
+            'name': f"C{k}",
+            'subjects': names,
+            'credits': {s: rng.randint(*credits) for s in names},
+            'priorities': {s: rng.randint(1, 5) for s in names},
+            'teachers': {s: rng.randrange(teachers) for s in names},
+        })
+    return {'timeslots': timeslots, 'break_slots': break_slots, 'teacher_busy': teacher_busy,
+            'classes': school_classes}
+
+
+def is_feasible(schedule, credits, invalid_slots, max_per_day=2):
+    """Every credit placed, no blocked slot used, at most max_per_day lectures of a subject per day."""
+    placed = {}
+    per_day = {}
+    cells = set()
+    for entry in schedule:
+        cell = (entry['day'], entry['timeslot'])
+        if cell in cells or cell in invalid_slots.get(entry['subject'], ()):
+            return False
+        cells.add(cell)
+        placed[entry['subject']] = placed.get(entry['subject'], 0) + 1
+        key = (entry['subject'], entry['day'])
+        per_day[key] = per_day.get(key, 0) + 1
+        if per_day[key] > max_per_day:
+            return False
+    return placed == {s: n for s, n in credits.items() if n}
+
+
+def _attempts():
+    # Schedules built so far by the searches of this process and its workers (see algorithms._search)
+    return metrics.snapshot()[1].get('attempts', 0)
+
+
+def run_school(school, ga_options, seed, rules=None):
+    """
+    Generates every class in order, each one blocked by the teachers' outside
+    commitments and by the classes generated before it, under `rules` (resolved
+    rule settings, None for the defaults).
+    Returns dict(seconds, candidates, feasible, classes, score); score sums the
+    feasible classes only.
+    """
+    busy = {t: set(slots) for t, slots in school['teacher_busy'].items()}
+    candidates = 0
+    feasible = 0
+    score = 0
+    started = time.perf_counter()
+
+    for offset, school_class in enumerate(school['classes']):
+        invalid_slots = {}
+        for subject in school_class['subjects']:
+            blocked = set(busy[school_class['teachers'][subject]])
+            blocked.update((day, slot) for day in DAYS for slot in school['break_slots'])
+            invalid_slots[subject] = blocked
+
+        teacher_busy = {school_class['teachers'][s]: busy[school_class['teachers'][s]] for s in school_class['subjects']}
+        model = ProblemModel(school_class['subjects'], school['timeslots'], school_class['priorities'],
+                             school_class['credits'], invalid_slots, rules, school_class['teachers'], teacher_busy)
+        before = _attempts()
+        schedule = generate_schedule(school_class['subjects'], school['timeslots'], school_class['priorities'],
+                                     school_class['credits'], invalid_slots=invalid_slots, seed=seed + offset,
+                                     model=model, **ga_options)
+        # A backtracking search that succeeds builds its one schedule without counting attempts
+        candidates += (_attempts() - before) or (1 if schedule else 0)
+
+        if schedule and is_feasible(schedule, effective_credits(school_class['credits'], model.rules),
+                                    blocked_slots(model.rules, school['timeslots'], invalid_slots),
+                                    day_limit(model.rules, len(school['timeslots']))):
+            feasible += 1
+            score += model.score(schedule)
+        for entry in schedule:
+            busy[school_class['teachers'][entry['subject']]].add((entry['day'], entry['timeslot']))
+
+    return dict(seconds=time.perf_counter() - started, candidates=candidates, feasible=feasible,
+                classes=len(school['classes']), score=score)
+
+
+def run_scenario(name, params, ga_options, repeats, seed, rules=None):
+    school = make_school(seed=seed, **params)
+    runs = [run_school(school, ga_options, seed + 1000 * r, rules) for r in range(repeats)]
+
+    # Memory is measured on a separate run: tracemalloc slows everything down
+    tracemalloc.start()
+    run_school(school, ga_options, seed, rules)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = [r['seconds'] for r in runs]
+    scores = [r['score'] for r in runs]
+    total_classes = sum(r['classes'] for r in runs)
+    return {
+        'scenario': name,
+        'params': dict(params, credits=list(params['credits'])),
+        'repeats': repeats,
+        'wall_time_s': {'median': statistics.median(seconds), 'min': min(seconds), 'max': max(seconds)},
+        'candidates_per_s': sum(r['candidates'] for r in runs) / sum(seconds),
+        'feasibility_rate': sum(r['feasible'] for r in runs) / total_classes,
+        'score': {'best': max(scores), 'median': statistics.median(scores)},
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': numpy_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline):
+    """Prints current vs baseline for the scenarios both files have."""
+    previous = {s['scenario']: s for s in baseline['scenarios']}
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')}):")
+    for current in results['scenarios']:
+        old = previous.get(current['scenario'])
+        if old is None:
+            continue
+        time_ratio = current['wall_time_s']['median'] / old['wall_time_s']['median']
+        print(f"  {current['scenario']:<10} time x{time_ratio:.2f}  "
+              f"score {old['score']['median']:.0f} -> {current['score']['median']:.0f}  "
+              f"feasible {old['feasibility_rate']:.0%} -> {current['feasibility_rate']:.0%}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='small,medium,large,tight',
+                        help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON file of an earlier run to compare against")
+
+    ga = parser.add_argument_group('generator options (passed to generate_schedule)')
+    ga.add_argument('--engine', default='genetic', choices=ENGINES)
+    ga.add_argument('--node-limit', type=int, default=20000, help="backtracking engine only")
+    ga.add_argument('--time-limit-ms', type=int, default=500, help="backtracking engine only")
+    ga.add_argument('--generations', type=int, default=100)
+    ga.add_argument('--population', type=int, default=20)
+    ga.add_argument('--mode', default='evolve', choices=['evolve', 'restarts'])
+    ga.add_argument('--elite-size', type=int, default=2)
+    ga.add_argument('--workers', type=int, default=1)
+    ga.add_argument('--polish-ms', type=int, default=0)
+    ga.add_argument('--rules', help="JSON file of rule settings (see src/logic/rules.py), default rules otherwise")
+
+    custom = parser.add_argument_group('custom scenario (any of these adds a "custom" scenario)')
+    custom.add_argument('--classes', type=int)
+    custom.add_argument('--subjects', type=int)
+    custom.add_argument('--credits', help="min-max weekly lectures per subject, e.g. 3-5")
+    custom.add_argument('--periods', type=int)
+    custom.add_argument('--teachers', type=int)
+    custom.add_argument('--conflict-density', type=float)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    scenarios = {}
+    for name in filter(None, args.scenarios.split(',')):
+        if name not in SCENARIOS:
+            sys.exit(f"Unknown scenario '{name}'")
+        scenarios[name] = SCENARIOS[name]
+
+    overrides = {k: getattr(args, k) for k in ('classes', 'subjects', 'periods', 'teachers', 'conflict_density')
+                 if getattr(args, k) is not None}
+    if args.credits:
+        low, _, high = args.credits.partition('-')
+        overrides['credits'] = (int(low), int(high or low))
+    if overrides:
+        scenarios['custom'] = dict(SCENARIOS['medium'], **overrides)
+
+    ga_options = dict(generations=args.generations, population_size=args.population, mode=args.mode,
+                      elite_size=args.elite_size, workers=args.workers, polish_ms=args.polish_ms,
+                      engine=args.engine)
+    if args.engine == 'backtracking':
+        ga_options.update(node_limit=args.node_limit, time_limit_ms=args.time_limit_ms)
+
+    rules = None
+    if args.rules:
+        with open(args.rules) as f:
+            try:
+                rules = resolve_rules(json.load(f))
+            except ValueError as e:
+                sys.exit(f"Invalid rules in {args.rules}: {e}")
+
+    results = {'environment': environment(), 'generator': dict(ga_options, rules=rules), 'scenarios': []}
+    for name, params in scenarios.items():
+        result = run_scenario(name, params, ga_options, args.repeats, args.seed, rules)
+        results['scenarios'].append(result)
+        print(f"{name:<10} {result['wall_time_s']['median']:8.3f}s  "
+              f"{result['candidates_per_s']:9.0f} cand/s  "
+              f"feasible {result['feasibility_rate']:6.1%}  "
+              f"score best {result['score']['best']:.0f} / median {result['score']['median']:.0f}  "
+              f"peak {result['peak_memory_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
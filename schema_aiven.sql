@@ -11,6 +11,7 @@ USE `defaultdb`;
 
 DROP TABLE IF EXISTS `allocated_timeslots`;
 DROP TABLE IF EXISTS `practical`;
+DROP TABLE IF EXISTS `generation_run`;
 DROP TABLE IF EXISTS `timetable`;
 DROP TABLE IF EXISTS `subject`;
 DROP TABLE IF EXISTS `teacher`;
@@ -31,6 +32,7 @@ CREATE TABLE `schools` (
   `lecture_duration` int,
   `break_start_time` varchar(10),
   `break_duration` int,
+  `rules` text,
   PRIMARY KEY (`school_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
@@ -110,9 +112,25 @@ CREATE TABLE `timetable` (
   `day` varchar(15) DEFAULT NULL,
   `school_id` int NOT NULL,
   PRIMARY KEY (`timetable_id`),
+  KEY `idx_timetable_teacher_slot` (`school_id`, `teacher_id`, `day`, `time_id`),
+  KEY `idx_timetable_class` (`school_id`, `class_id`),
   CONSTRAINT `fk_timetable_school` FOREIGN KEY (`school_id`) REFERENCES `schools` (`school_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
+-- Table: generation_run
+-- Seed and engine settings of the generation that produced a class's stored timetable
+CREATE TABLE `generation_run` (
+  `school_id` int NOT NULL,
+  `class_id` int NOT NULL,
+  `semester` int NOT NULL,
+  `seed` bigint NOT NULL,
+  `score` int DEFAULT NULL,
+  `params` text,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`school_id`, `class_id`, `semester`),
+  CONSTRAINT `fk_generation_run_school` FOREIGN KEY (`school_id`) REFERENCES `schools` (`school_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
 -- Table: allocated_timeslots
 CREATE TABLE `allocated_timeslots` (
   `allocation_id` int NOT NULL AUTO_INCREMENT,
@@ -148,6 +166,13 @@ CREATE TABLE `practical` (
   CONSTRAINT `fk_prac_school` FOREIGN KEY (`school_id`) REFERENCES `schools` (`school_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
+-- Existing databases: run the CREATE TABLE `generation_run` above, and add the
+-- timetable indexes and the schools.rules column without recreating the tables
+-- ALTER TABLE `timetable`
+--   ADD KEY `idx_timetable_teacher_slot` (`school_id`, `teacher_id`, `day`, `time_id`),
+--   ADD KEY `idx_timetable_class` (`school_id`, `class_id`);
+-- ALTER TABLE `schools` ADD COLUMN `rules` text;
+
 SET SQL_MODE=@OLD_SQL_MODE;
 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;
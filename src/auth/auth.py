@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
-from src.database.database import connect_db
+from src.database.database import db_connection, invalidate_occupancy
+from src.utils.cache import invalidate_school, school_id_cache
+from src.utils.results import get_result_store
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -41,23 +43,21 @@ def register():
 
             hashed_password = generate_password_hash(password)
 
-            db = connect_db()
-            cursor = db.cursor()
+            with db_connection() as db:
+                cursor = db.cursor()
             
-            # Check unique username
-            cursor.execute("SELECT school_id FROM schools WHERE username = %s", (username,))
-            if cursor.fetchone():
-                flash('Username already exists', 'error')
-                db.close()
-                return redirect(url_for('auth.register'))
-
-            sql = """
-                INSERT INTO schools (school_name, username, password_hash, start_time, end_time, lecture_duration, break_start_time, break_duration)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(sql, (school_name, username, hashed_password, start_time_str, end_time_str, lecture_duration, break_start_str, break_duration))
-            db.commit()
-            db.close()
+                # Check unique username
+                cursor.execute("SELECT school_id FROM schools WHERE username = %s", (username,))
+                if cursor.fetchone():
+                    flash('Username already exists', 'error')
+                    return redirect(url_for('auth.register'))
+
+                sql = """
+                    INSERT INTO schools (school_name, username, password_hash, start_time, end_time, lecture_duration, break_start_time, break_duration)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """
+                cursor.execute(sql, (school_name, username, hashed_password, start_time_str, end_time_str, lecture_duration, break_start_str, break_duration))
+                db.commit()
 
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('auth.login'))
@@ -74,11 +74,10 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
 
-        db = connect_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM schools WHERE username = %s", (username,))
-        school = cursor.fetchone()
-        db.close()
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM schools WHERE username = %s", (username,))
+            school = cursor.fetchone()
 
         if school and check_password_hash(school['password_hash'], password):
             session['school_id'] = school['school_id']
@@ -102,6 +101,8 @@ def login():
 
 @auth_bp.route('/logout')
 def logout():
+    if session.get('timetable_id'):
+        get_result_store().delete(session['timetable_id'])
     session.clear()
     flash('Logged out successfully', 'info')
     return redirect(url_for('auth.login'))
@@ -112,43 +113,48 @@ def delete_account():
         return redirect(url_for('auth.login'))
         
     try:
-        db = connect_db()
-        cursor = db.cursor()
+        with db_connection() as db:
+            cursor = db.cursor()
         
-        school_id = session['school_id']
+            school_id = session['school_id']
 
-        # Manual Cascade Deletion to resolve missing Foreign Key constraints
-        # Order matters: Delete child records first to satisfy constraints
+            # Manual Cascade Deletion to resolve missing Foreign Key constraints
+            # Order matters: Delete child records first to satisfy constraints
 
-        # 1. Delete Timetable entries
-        cursor.execute("DELETE FROM timetable WHERE school_id = %s", (school_id,))
+            # 1. Delete Timetable entries
+            cursor.execute("DELETE FROM timetable WHERE school_id = %s", (school_id,))
+            cursor.execute("DELETE FROM generation_run WHERE school_id = %s", (school_id,))
 
-        # 2. Delete Allocated Timeslots
-        cursor.execute("DELETE FROM allocated_timeslots WHERE school_id = %s", (school_id,))
+            # 2. Delete Allocated Timeslots
+            cursor.execute("DELETE FROM allocated_timeslots WHERE school_id = %s", (school_id,))
 
-        # 3. Delete Practicals
-        cursor.execute("DELETE FROM practical WHERE school_id = %s", (school_id,))
+            # 3. Delete Practicals
+            cursor.execute("DELETE FROM practical WHERE school_id = %s", (school_id,))
 
-        # 4. Delete Subjects (Dependent on teacher, class, course)
-        cursor.execute("DELETE FROM subject WHERE school_id = %s", (school_id,))
+            # 4. Delete Subjects (Dependent on teacher, class, course)
+            cursor.execute("DELETE FROM subject WHERE school_id = %s", (school_id,))
         
-        # 5. Delete Rooms
-        cursor.execute("DELETE FROM room WHERE school_id = %s", (school_id,))
+            # 5. Delete Rooms
+            cursor.execute("DELETE FROM room WHERE school_id = %s", (school_id,))
 
-        # 6. Delete Classes
-        cursor.execute("DELETE FROM class WHERE school_id = %s", (school_id,))
+            # 6. Delete Classes
+            cursor.execute("DELETE FROM class WHERE school_id = %s", (school_id,))
 
-        # 7. Delete Teachers
-        cursor.execute("DELETE FROM teacher WHERE school_id = %s", (school_id,))
+            # 7. Delete Teachers
+            cursor.execute("DELETE FROM teacher WHERE school_id = %s", (school_id,))
         
-        # 8. Delete Courses
-        cursor.execute("DELETE FROM course WHERE school_id = %s", (school_id,))
+            # 8. Delete Courses
+            cursor.execute("DELETE FROM course WHERE school_id = %s", (school_id,))
 
-        # 9. Finally delete the School record
-        cursor.execute("DELETE FROM schools WHERE school_id = %s", (school_id,))
+            # 9. Finally delete the School record
+            cursor.execute("DELETE FROM schools WHERE school_id = %s", (school_id,))
         
-        db.commit()
-        db.close()
+            db.commit()
+        invalidate_occupancy(school_id)
+        invalidate_school(school_id)
+        school_id_cache.clear()
+        if session.get('timetable_id'):
+            get_result_store().delete(session['timetable_id'])
         
         session.clear()
         flash('Account deleted successfully.', 'info')
@@ -1,75 +1,226 @@
 
-import mysql.connector
+import threading
+import time
+from contextlib import contextmanager
+
+from mysql.connector import errors, pooling
+from src.database.timeslots import timeslot_registry
 from src.logic.config import Config
-from datetime import timedelta
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Checkout counters exposed through pool_stats()
+_stats_lock = threading.Lock()
+_stats = {
+    'checkouts': 0,
+    'in_use': 0,
+    'waits': 0,
+    'wait_seconds_total': 0.0,
+    'wait_seconds_max': 0.0,
+    'timeouts': 0,
+    'reconnects': 0,
+}
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name='timetable',
+                pool_size=Config.DB_POOL_SIZE,
+                pool_reset_session=True,
+                host=Config.DB_HOST,
+                user=Config.DB_USER,
+                password=Config.DB_PASSWORD,
+                database=Config.DB_NAME,
+                port=Config.DB_PORT,
+            )
+        return _pool
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled connection: close() hands it back to the pool
+    (and keeps the in-use counter right); everything else is delegated.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        with _stats_lock:
+            _stats['in_use'] -= 1
+        conn.close()
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[key] += value
+
 
 def connect_db():
-    return mysql.connector.connect(
-        host=Config.DB_HOST,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        database=Config.DB_NAME,
-        port=Config.DB_PORT,
-    )
+    """
+    Checks a connection out of the shared pool, waiting up to Config.DB_POOL_TIMEOUT
+    seconds when all connections are busy. Stale connections are pinged back to life
+    before being handed out. Call close() (or use db_connection()) to return it.
+    """
+    pool = get_pool()
+    started = time.monotonic()
+    waited = False
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except errors.PoolError:
+            if time.monotonic() - started >= Config.DB_POOL_TIMEOUT:
+                _record(timeouts=1)
+                raise
+            waited = True
+            time.sleep(0.01)
 
-def fetch_data(class_name, semester, school_id):
+    wait = time.monotonic() - started
+    with _stats_lock:
+        _stats['checkouts'] += 1
+        _stats['in_use'] += 1
+        if waited:
+            _stats['waits'] += 1
+            _stats['wait_seconds_total'] += wait
+            _stats['wait_seconds_max'] = max(_stats['wait_seconds_max'], wait)
+
+    # Health check: the server may have dropped an idle connection
+    try:
+        if not conn.is_connected():
+            conn.reconnect(attempts=2, delay=0)
+            _record(reconnects=1)
+    except Exception:
+        with _stats_lock:
+            _stats['in_use'] -= 1
+        conn.close()
+        raise
+
+    return PooledConnection(conn)
+
+
+@contextmanager
+def db_connection():
+    """
+    Request-scoped connection: always returned to the pool, rolled back if the
+    block raised before committing.
+    """
     db = connect_db()
-    cursor = db.cursor()
+    try:
+        yield db
+    except Exception:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        db.close()
 
-    cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
-    class_id = cursor.fetchone()
 
-    if class_id is None:
-        return [], []
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['pool_size'] = Config.DB_POOL_SIZE
+    return stats
 
-    class_id = class_id[0]
-    cursor.execute("SELECT subject_name FROM subject WHERE class_id = %s AND semester = %s AND school_id = %s", (class_id, semester, school_id))
-    subjects = [row[0] for row in cursor.fetchall()]
 
-    # Timeslots are now generic or per allocation? 
-    # For now, sticking to logic where we just need a list? 
-    # Actually, timeslots come from school config now usually.
-    # But let's keep this query valid just in case.
-    cursor.execute("SELECT timeslot FROM timeslot") 
-    timeslots = [row[0] for row in cursor.fetchall()]
+# 🔹 Per-school teacher occupancy, school_id -> (fingerprint, occupancy)
+_occupancy = {}
+_occupancy_lock = threading.Lock()
+
+
+def school_occupancy(cursor, school_id):
+    """
+    Every stored lecture of a school as {teacher_id: [(day, time_id, class_id, subject_id), ...]}.
+    Cached per school; the cache is checked against the school's row count and highest
+    timetable_id (an index-only read), so writes from other workers are noticed too.
+    That only holds for INSERT and DELETE: writers must not UPDATE rows in place.
+    Callers must not modify the returned structure. Needs a dictionary cursor.
+    """
+    cursor.execute("SELECT COUNT(*) AS n, MAX(timetable_id) AS last_id FROM timetable WHERE school_id = %s", (school_id,))
+    row = cursor.fetchone()
+    fingerprint = (row['n'], row['last_id'])
+    with _occupancy_lock:
+        cached = _occupancy.get(school_id)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    cursor.execute("SELECT teacher_id, day, time_id, class_id, subject_id FROM timetable WHERE school_id = %s", (school_id,))
+    occupancy = {}
+    for r in cursor.fetchall():
+        occupancy.setdefault(r['teacher_id'], []).append((r['day'], r['time_id'], r['class_id'], r['subject_id']))
+    with _occupancy_lock:
+        _occupancy[school_id] = (fingerprint, occupancy)
+    return occupancy
+
+
+def invalidate_occupancy(school_id):
+    """Drops the cached occupancy of a school; call after writing its timetable rows."""
+    with _occupancy_lock:
+        _occupancy.pop(school_id, None)
+
+def fetch_data(class_name, semester, school_id):
+    with db_connection() as db:
+        cursor = db.cursor()
+
+        cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
+        class_id = cursor.fetchone()
+
+        if class_id is None:
+            return [], []
+
+        class_id = class_id[0]
+        cursor.execute("SELECT subject_name FROM subject WHERE class_id = %s AND semester = %s AND school_id = %s", (class_id, semester, school_id))
+        subjects = [row[0] for row in cursor.fetchall()]
+
+        # Timeslots are now generic or per allocation? 
+        # For now, sticking to logic where we just need a list? 
+        # Actually, timeslots come from school config now usually.
+        timeslots = timeslot_registry.all_times(db)
 
-    db.close()
     return subjects, timeslots
 
 def get_timetable_by_class(class_name, semester, school_id):
-    db = connect_db()
-    cursor = db.cursor()
+    with db_connection() as db:
+        cursor = db.cursor()
 
-    # Get class_id
-    cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
-    result = cursor.fetchone()
-    if not result:
-        db.close()
-        return {}, []
-    
-    class_id = result[0]
-
-    # Fetch timetable with day and timeslot
-    query = """
-    SELECT s.subject_name, t.day, ts.timeslot 
-    FROM timetable t
-    JOIN subject s ON t.subject_id = s.subject_id
-    JOIN timeslot ts ON t.time_id = ts.time_id
-    WHERE t.class_id = %s AND s.semester = %s AND t.school_id = %s
-    """
-    cursor.execute(query, (class_id, semester, school_id))
-    results = cursor.fetchall()
-    
-    # Fetch all timeslots for structure
-    cursor.execute("SELECT timeslot FROM timeslot")
-    all_timeslots = [str(row[0]) for row in cursor.fetchall()]
+        # Get class_id
+        cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
+        result = cursor.fetchone()
+        if not result:
+            return {}, []
+
+        class_id = result[0]
+
+        # Fetch timetable with day and timeslot
+        query = """
+        SELECT s.subject_name, t.day, t.time_id
+        FROM timetable t
+        JOIN subject s ON t.subject_id = s.subject_id
+        WHERE t.class_id = %s AND s.semester = %s AND t.school_id = %s
+        """
+        cursor.execute(query, (class_id, semester, school_id))
+        results = cursor.fetchall()
 
-    db.close()
+        # Timeslot strings for the ids and for structure
+        id_to_time_map = timeslot_registry.id_to_time(db, {time_id for _, _, time_id in results})
+        all_timeslots = timeslot_registry.all_times(db)
 
     timetable = {}
-    for subject, day, timeslot in results:
-        if isinstance(timeslot, timedelta):
-            timeslot = str(timeslot)
-        timetable[f"{day}_{timeslot}"] = subject
+    for subject, day, time_id in results:
+        if time_id in id_to_time_map:
+            timetable[f"{day}_{id_to_time_map[time_id]}"] = subject
 
-    return timetable, sorted(all_timeslots)
+    return timetable, all_timeslots
@@ -0,0 +1,94 @@
+import threading
+from datetime import timedelta
+
+
+def normalize_time(value):
+    """
+    Canonical 'HH:MM:SS' string for a timeslot, whether it comes from MySQL
+    (timedelta) or from a form / day_schedule ('9:00:00', '09:00:00').
+    """
+    if isinstance(value, timedelta):
+        total = int(value.total_seconds())
+        return f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+    value = str(value)
+    if len(value) == 7: # 9:00:00 -> 09:00:00
+        value = "0" + value
+    return value
+
+
+class TimeslotRegistry:
+    """
+    Process-wide time <-> time_id map of the global `timeslot` table.
+    Loaded on first use and re-read only when a lookup misses (a slot inserted
+    here or by another worker), so requests don't query the table every time.
+    """
+
+    def __init__(self):
+        self._by_time = {}
+        self._by_id = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _reload(self, db):
+        cursor = db.cursor()
+        cursor.execute("SELECT time_id, timeslot FROM timeslot")
+        by_time, by_id = {}, {}
+        for time_id, timeslot in cursor.fetchall():
+            t_str = normalize_time(timeslot)
+            by_id[time_id] = t_str
+            # Keep the first id if the table holds duplicates
+            by_time.setdefault(t_str, time_id)
+        cursor.close()
+        self._by_time, self._by_id = by_time, by_id
+        self._loaded = True
+
+    def _ensure_loaded(self, db):
+        if not self._loaded:
+            self._reload(db)
+
+    def ids_for(self, db, timeslots):
+        """
+        Returns {time_string: time_id} for timeslots, inserting (and committing)
+        the ones the table doesn't have yet.
+        """
+        wanted = [normalize_time(t) for t in timeslots]
+        with self._lock:
+            self._ensure_loaded(db)
+            if any(t not in self._by_time for t in wanted):
+                # Another worker may have added them already
+                self._reload(db)
+                missing = [t for t in dict.fromkeys(wanted) if t not in self._by_time]
+                if missing:
+                    cursor = db.cursor()
+                    for t_str in missing:
+                        cursor.execute("INSERT INTO timeslot (timeslot, type_of_class) VALUES (%s, 'lecture')", (t_str,))
+                        self._by_time[t_str] = cursor.lastrowid
+                        self._by_id[cursor.lastrowid] = t_str
+                    db.commit()
+                    cursor.close()
+            return {t: self._by_time[t] for t in wanted}
+
+    def id_to_time(self, db, time_ids=()):
+        """
+        Returns the {time_id: time_string} map, re-reading the table first if any of
+        time_ids is unknown.
+        """
+        with self._lock:
+            self._ensure_loaded(db)
+            if any(t_id not in self._by_id for t_id in time_ids):
+                self._reload(db)
+            return self._by_id
+
+    def all_times(self, db):
+        """Every distinct timeslot string, sorted."""
+        with self._lock:
+            self._ensure_loaded(db)
+            return sorted(self._by_time)
+
+    def clear(self):
+        with self._lock:
+            self._by_time, self._by_id = {}, {}
+            self._loaded = False
+
+
+timeslot_registry = TimeslotRegistry()
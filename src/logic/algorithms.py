@@ -1,187 +1,590 @@
-
+import pickle
 import random
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.logic.backtracking import backtrack
+from src.logic.encoding import DAYS, EMPTY, ScheduleEncoding
+from src.logic.feasibility import lowest_bit
+from src.logic.fitness import score_population
+from src.logic.local_search import anneal
+from src.logic.model import ProblemModel, get_high_priority_subjects
+from src.logic.rules import Objective, resolve_rules
+from src.utils import metrics
+
+# Process pool shared by parallel searches, created on first use
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+# Engines accepted by generate_schedule
+ENGINES = ("genetic", "backtracking")
+
+
+def new_seed():
+    """A fresh random seed, for callers that want to record the seed of a run."""
+    return random.SystemRandom().randrange(2 ** 32)
+
+
+def calculate_distribution_score(schedule, timeslots, priorities, high_priority_subjects=None):
+    """
+    Scores a schedule (list of {"day", "timeslot", "subject"} dicts).
+    Higher is better: rewards daily variety and consecutive high priority lectures,
+    penalizes more than 2 lectures per day and non-contiguous duplicates.
+    This is the score under the default rules; see score_schedule for a school's rules.
+    """
+    if high_priority_subjects is None:
+        high_priority_subjects = get_high_priority_subjects(priorities)
+
+    score = 0
+    day_schedules = {day: [] for day in DAYS}
+    for entry in schedule:
+        day_schedules[entry['day']].append(entry)
+
+    time_idx_map = {t: i for i, t in enumerate(timeslots)}
+
+    for day, entries in day_schedules.items():
+        # Sort by time to check for consecutive slots
+        entries.sort(key=lambda x: time_idx_map.get(x['timeslot'], 0))
+
+        subject_slots = {} # subj -> list of slot indices
+        for i in range(len(entries)):
+            entry = entries[i]
+            subj = entry['subject']
+            slot_idx = time_idx_map.get(entry['timeslot'], 0)
+
+            if subj not in subject_slots:
+                subject_slots[subj] = []
+            subject_slots[subj].append(slot_idx)
+
+            # Reward consecutive placement for high priority subjects
+            if i > 0:
+                prev_entry = entries[i-1]
+                prev_idx = time_idx_map.get(prev_entry['timeslot'])
 
-def genetic_algorithm(subjects, timeslots, priorities, credits, invalid_slots=None, generations=100, population_size=20):
+                if prev_entry['subject'] == subj and subj in high_priority_subjects and slot_idx == prev_idx + 1:
+                    # Bonus for truly consecutive high-priority lectures
+                    score += 20 * priorities.get(subj, 1)
+
+            # General priority reward
+            score += priorities.get(subj, 1) * 2
+
+        # Reward variety: High bonus for number of unique subjects on a day
+        score += len(subject_slots) * 100
+
+        for subj, indices in subject_slots.items():
+            count = len(indices)
+            if count > 2:
+                # HEAVY penalty for exceeding daily limit
+                score -= (count - 2) * 500
+            elif count == 2 and subj not in high_priority_subjects:
+                # Minor penalty for non-high priority subjects having 2 lectures
+                score -= 20
+
+            # 🔹 Penalize if multiple lectures on same day are NOT contiguous
+            if count >= 2:
+                indices.sort()
+                if (indices[-1] - indices[0]) != (count - 1):
+                    score -= 100 * count
+
+            # Reward spreading: Small bonus for each day a subject appears
+            score += 30
+
+    return score
+
+
+def score_schedule(schedule, timeslots, priorities, rules=None, teachers=None, teacher_busy=None):
+    """
+    Scores a schedule (list of {"day", "timeslot", "subject"} dicts) under a school's
+    rules (see rules.resolve_rules; None for the defaults, which give the same score
+    as calculate_distribution_score). teachers / teacher_busy as in ProblemModel.
+    """
+    high_priority_subjects = get_high_priority_subjects(priorities)
+    encoding = ScheduleEncoding([entry['subject'] for entry in schedule], timeslots, priorities, high_priority_subjects)
+    objective = Objective(encoding, resolve_rules(rules), teachers, teacher_busy)
+    return objective.score(encoding.encode(schedule))
+
+
+def _day_counts(grid, encoding):
+    # subject id -> lectures per day
+    counts = [[0] * encoding.n_days for _ in range(encoding.n_subjects)]
+    n_slots = encoding.n_slots
+    for c, sid in enumerate(grid):
+        if sid != EMPTY:
+            counts[sid][c // n_slots] += 1
+    return counts
+
+
+def _fill_randomly(rng, grid, pool, index):
+    """
+    Places every subject id in `pool` into a random free cell, respecting teacher
+    availability and the lectures-per-day limit (index.max_per_day). Mutates `grid`.
+    Returns False if some lecture could not be placed.
+    """
+    n_slots = index.n_slots
+    limit = index.max_per_day
+    free_cells = [c for c, sid in enumerate(grid) if sid == EMPTY]
+    day_counts = _day_counts(grid, index.encoding)
+
+    rng.shuffle(pool)
+    rng.shuffle(free_cells)
+
+    for sid in pool:
+        valid = index.valid_cells[sid]
+        counts = day_counts[sid]
+        for i, c in enumerate(free_cells):
+            # Strict Limit: At most `limit` lectures per day
+            if (valid >> c) & 1 and counts[c // n_slots] < limit:
+                grid[c] = sid
+                counts[c // n_slots] += 1
+                free_cells.pop(i)
+                break
+        else:
+            return False
+    return True
+
+
+def _construct_schedule(rng, model, stats=None):
+    """
+    Builds one random feasible grid, or returns None if the random fill got stuck.
+    stats, if given, accumulates the seconds spent per step and the rejected
+    placements (doubles with no free pair, lectures with no valid cell).
+    """
+    started = time.perf_counter() if stats is not None else 0.0
+    encoding = model.encoding
+    index = model.index
+    n_slots = encoding.n_slots
+    grid = encoding.empty()
+    free = [index.full_day] * encoding.n_days
+    remaining = list(model.target)
+
+    # (No doubles at all when the school allows only one lecture of a subject per day)
+    shuffled_high_priority = [sid for sid in range(encoding.n_subjects)
+                              if encoding.high_priority[sid] and index.max_per_day >= 2]
+    rng.shuffle(shuffled_high_priority)
+    days = list(range(encoding.n_days))
+
+    # 1. Attempt to place ONE consecutive double for High Priority subjects
+    for sid in shuffled_high_priority:
+        if remaining[sid] < 2:
+            continue
+
+        # Find a day with 2 consecutive VALID free slots (earliest pair on that day)
+        rng.shuffle(days)
+        for day_idx in days:
+            pairs = index.consecutive_pairs(sid, day_idx, free[day_idx])
+            if pairs:
+                slot_idx = lowest_bit(pairs)
+                grid[day_idx * n_slots + slot_idx] = sid
+                grid[day_idx * n_slots + slot_idx + 1] = sid
+                free[day_idx] &= ~(3 << slot_idx)
+                remaining[sid] -= 2
+                break # Move to next priority subject
+        else:
+            if stats is not None:
+                stats['rejected_placements'] += 1
+
+    if stats is not None:
+        doubles_done = time.perf_counter()
+        stats['place_doubles'] += doubles_done - started
+
+    # 2. Assign remaining credits normally (Random logic)
+    pool = [sid for sid, count in enumerate(remaining) for _ in range(count)]
+    filled = _fill_randomly(rng, grid, pool, index)
+    if stats is not None:
+        stats['random_fill'] += time.perf_counter() - doubles_done
+        if not filled:
+            stats['rejected_placements'] += 1
+    return grid if filled else None
+
+
+def _repair(rng, grid, model):
+    """
+    Turns an arbitrary child grid back into a feasible one: clears invalid cells,
+    trims subjects above their credit count and re-places the missing lectures
+    randomly. Returns None if the missing lectures do not fit.
+    """
+    index = model.index
+    target = model.target
+    placed = [[] for _ in range(model.encoding.n_subjects)]
+    for c, sid in enumerate(grid):
+        if sid == EMPTY:
+            continue
+        if index.is_valid(sid, c):
+            placed[sid].append(c)
+        else:
+            grid[c] = EMPTY
+
+    pool = []
+    for sid, cells in enumerate(placed):
+        extra = len(cells) - target[sid]
+        if extra > 0:
+            for c in rng.sample(cells, extra):
+                grid[c] = EMPTY
+        else:
+            pool.extend([sid] * -extra)
+
+    if not _fill_randomly(rng, grid, pool, index):
+        return None
+    return grid
+
+
+def _crossover(rng, parent_a, parent_b, encoding):
+    # Day-wise uniform crossover: each day's lectures are inherited as a block
+    child = array('h', parent_a)
+    n_slots = encoding.n_slots
+    for base in range(0, encoding.size, n_slots):
+        if rng.random() < 0.5:
+            child[base:base + n_slots] = parent_b[base:base + n_slots]
+    return child
+
+
+def _mutate(rng, grid):
+    # Drop a few lectures; _repair re-places them somewhere else
+    filled = [c for c, sid in enumerate(grid) if sid != EMPTY]
+    if filled:
+        for c in rng.sample(filled, rng.randint(1, max(1, len(filled) // 6))):
+            grid[c] = EMPTY
+    return grid
+
+
+def _tournament(rng, scored, k=3):
+    contenders = rng.sample(scored, min(k, len(scored)))
+    return max(contenders, key=lambda c: c[0])[1]
+
+
+def genetic_algorithm(subjects, timeslots, priorities, credits, invalid_slots=None, generations=100, population_size=20,
+                      mode="evolve", patience=None, mutation_rate=0.3, elite_size=2, workers=1, seed=None,
+                      polish_ms=0, progress=None, rng=None, model=None):
     """
     Generates a timetable that strictly respects credits and teacher availability constraints.
     Prioritizes placing 2 consecutive lectures for high priority subjects.
     invalid_slots: dict {subject: set([(day, time_str), ...])}
+
+    mode="evolve" seeds a population with random constructions and refines it over
+    `generations` with tournament selection, day-wise crossover, repair-based mutation
+    and elitism, stopping early once the best score has not improved for `patience`
+    generations. mode="restarts" keeps the old behaviour of independent random
+    constructions and returns the best one.
+
+    workers > 1 runs that many independent searches in worker processes, seeded
+    with base, base + 1, ... (base drawn from the RNG), and returns the best result.
+
+    All randomness comes from `rng` (a random.Random) or, if not given, from
+    random.Random(seed), so the same seed and inputs give the same timetable.
+    Pass a seed from new_seed() to be able to replay a run; without one the
+    result is not reproducible. (With polish_ms > 0 the annealing pass stops on
+    the clock, so its result also depends on machine speed.)
+
+    The constraints are checked first (see check_feasibility); when they can't be
+    met no search is run and [] is returned straight away.
+
+    polish_ms > 0 runs a simulated annealing pass (see local_search.anneal) on the
+    best schedule of each search for that many milliseconds.
+
+    progress, if given, is called as progress(generation, best_score) after every
+    generation (once at the end for restarts / parallel runs). It may raise to abort
+    the search, e.g. when a background job is cancelled.
+
+    model, if given, is the already compiled ProblemModel of these inputs (the
+    other arguments describing the problem are then not looked at). It is also
+    how a school's rules (see rules.RULES) reach the search; without one the
+    default rules apply.
+    """
+    if model is None:
+        model = ProblemModel(subjects, timeslots, priorities, credits, invalid_slots)
+
+    options = dict(generations=generations, population_size=population_size, mode=mode, patience=patience,
+                   mutation_rate=mutation_rate, elite_size=elite_size, polish_ms=polish_ms)
+
+    if rng is None:
+        rng = random.Random(seed)
+
+    if not model.feasible:
+        return []
+
+    if workers and workers > 1:
+        # Worker seeds derive from the caller's RNG
+        best_score, schedule = _search_parallel(workers, rng.randrange(2 ** 32), model, options)
+        if progress is not None and best_score is not None:
+            progress(generations, best_score)
+    else:
+        _, schedule = _search(rng, model, progress=progress, **options)
+    return schedule
+
+
+def backtracking_algorithm(subjects, timeslots, priorities, credits, invalid_slots=None, node_limit=20000,
+                           time_limit_ms=500, seed=None, polish_ms=0, progress=None, rng=None, model=None,
+                           **fallback_options):
+    """
+    Same inputs and output as genetic_algorithm, but builds the timetable with a
+    backtracking search (see backtracking.backtrack): most constrained subject
+    first, forward checking on the per-day limit and on teacher / break slots.
+    Any timetable it returns is feasible, and on tight schedules it usually finds
+    one where random construction keeps failing.
+
+    The search stops after node_limit placements or time_limit_ms; it then falls
+    back to genetic_algorithm, called with the same RNG and fallback_options
+    (generations, population_size, workers, ...).
+
+    polish_ms > 0 runs simulated annealing on the result, as in genetic_algorithm.
+    progress is called once as progress(0, score) when the search succeeds.
+    model is the already compiled ProblemModel, if any (see genetic_algorithm);
+    the fallback reuses it.
+    """
+    if model is None:
+        model = ProblemModel(subjects, timeslots, priorities, credits, invalid_slots)
+    if rng is None:
+        rng = random.Random(seed)
+
+    if not model.feasible:
+        return []
+
+    with metrics.timer('backtracking'):
+        grid, _ = backtrack(model.index, model.target, rng, node_limit, time_limit_ms)
+    if grid is None:
+        return genetic_algorithm(subjects, timeslots, priorities, credits, invalid_slots=invalid_slots,
+                                 polish_ms=polish_ms, progress=progress, rng=rng, model=model, **fallback_options)
+
+    if polish_ms > 0:
+        grid, _ = anneal(grid, model.index, model.objective, polish_ms, rng)
+    if progress is not None:
+        progress(0, model.objective.score(grid))
+    return model.encoding.decode(grid)
+
+
+def generate_schedule(subjects, timeslots, priorities, credits, invalid_slots=None, engine="genetic", **options):
+    """
+    Runs the chosen engine ("genetic" or "backtracking", see ENGINES) with the
+    same inputs and output as genetic_algorithm. options go to the engine
+    (including model=, to reuse a ProblemModel compiled for check_feasibility).
+    """
+    if engine == "backtracking":
+        return backtracking_algorithm(subjects, timeslots, priorities, credits, invalid_slots, **options)
+    if engine == "genetic":
+        return genetic_algorithm(subjects, timeslots, priorities, credits, invalid_slots, **options)
+    raise ValueError(f"Unknown generation engine: {engine}")
+
+
+def check_feasibility(subjects, timeslots, credits, invalid_slots=None, rules=None):
+    """
+    Fast pre-check of whether the credits can be placed at all under invalid_slots
+    and the constraint rules (see feasibility.analyze). Takes milliseconds.
+    Returns the report with subject names: feasible, lectures, open_cells,
+    problems (each with a readable message), order (tightest subjects first)
+    and elapsed_ms. (ProblemModel(...).report() gives the same report and keeps
+    the compiled problem for the engines.)
+    """
+    return ProblemModel(subjects, timeslots, {}, credits, invalid_slots, rules).report()
+
+
+def _search(rng, model, generations, population_size, mode, patience, mutation_rate, elite_size, polish_ms,
+            progress=None):
     """
-    if invalid_slots is None:
-        invalid_slots = {}
-        
-    class_pool = []
-    for subject, count in credits.items():
-        class_pool.extend([subject] * count)
-        
-    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
-    all_slots = []
-    for day in days:
-        for slot in timeslots:
-            all_slots.append((day, slot))
-
-    # Identify high priority subjects (top tier)
-    # Identify high priority subjects (priority 4 and 5, or just the top tier)
-    max_p = max(priorities.values()) if priorities else 0
-    high_priority_subjects = {s for s, p in priorities.items() if p >= max(1, max_p - 1)}
-
-    def calculate_distribution_score(schedule):
-        score = 0
-        day_schedules = {day: [] for day in days}
-        for entry in schedule:
-            day_schedules[entry['day']].append(entry)
-        
-        time_idx_map = {t: i for i, t in enumerate(timeslots)}
-        
-        for day, entries in day_schedules.items():
-            # Sort by time to check for consecutive slots
-            entries.sort(key=lambda x: time_idx_map.get(x['timeslot'], 0))
-            
-            subject_slots = {} # subj -> list of slot indices
-            for i in range(len(entries)):
-                entry = entries[i]
-                subj = entry['subject']
-                slot_idx = time_idx_map.get(entry['timeslot'], 0)
-                
-                if subj not in subject_slots:
-                    subject_slots[subj] = []
-                subject_slots[subj].append(slot_idx)
-                
-                # Reward consecutive placement for high priority subjects
-                if i > 0:
-                    prev_entry = entries[i-1]
-                    prev_idx = time_idx_map.get(prev_entry['timeslot'])
-                    
-                    if prev_entry['subject'] == subj and subj in high_priority_subjects and slot_idx == prev_idx + 1:
-                        # Bonus for truly consecutive high-priority lectures
-                        score += 20 * priorities.get(subj, 1)
-                
-                # General priority reward
-                score += priorities.get(subj, 1) * 2
-
-            # Reward variety: High bonus for number of unique subjects on a day
-            score += len(subject_slots) * 100
-
-            for subj, indices in subject_slots.items():
-                count = len(indices)
-                if count > 2:
-                    # HEAVY penalty for exceeding daily limit
-                    score -= (count - 2) * 500
-                elif count == 2 and subj not in high_priority_subjects:
-                    # Minor penalty for non-high priority subjects having 2 lectures
-                    score -= 20
-                
-                # 🔹 Penalize if multiple lectures on same day are NOT contiguous
-                if count >= 2:
-                    indices.sort()
-                    if (indices[-1] - indices[0]) != (count - 1):
-                        score -= 100 * count
-                
-                # Reward spreading: Small bonus for each day a subject appears
-                score += 30
-                    
-        return score
-
-    best_schedule = []
-    best_score = float('-inf')
-
-    # Increase attempts to find a valid schedule if constraints are tight
-    attempts = max(population_size * 10, 200) 
-    
+    One complete search on a compiled ProblemModel. Returns (best_score, schedule),
+    or (None, []) when no feasible schedule was found.
+    Phase timings and attempt counters go to src.utils.metrics.
+    """
+    stats = dict(place_doubles=0.0, random_fill=0.0, scoring=0.0,
+                 attempts=0, feasible_attempts=0, rejected_placements=0)
+    started = time.perf_counter()
+    try:
+        best_score, best_grid = _evolve(rng, model, generations, population_size, mode, patience,
+                                        mutation_rate, elite_size, progress, stats)
+    finally:
+        _record_search(stats, time.perf_counter() - started)
+    if best_grid is None:
+        return None, []
+
+    if polish_ms > 0:
+        with metrics.timer('polish'):
+            best_grid, trajectory = anneal(best_grid, model.index, model.objective, polish_ms, rng)
+        best_score = trajectory[-1][1]
+    return best_score, model.encoding.decode(best_grid)
+
+
+_SEARCH_COUNTERS = ('attempts', 'feasible_attempts', 'rejected_placements')
+
+
+def _record_search(stats, seconds):
+    # One metrics update per search; the per-construction work only touches `stats`
+    for phase in ('place_doubles', 'random_fill', 'scoring'):
+        metrics.add_time(phase, stats[phase])
+    # Crossover, mutation, repair and bookkeeping
+    metrics.add_time('evolve', seconds - stats['place_doubles'] - stats['random_fill'] - stats['scoring'])
+    for name in _SEARCH_COUNTERS:
+        metrics.incr(name, stats[name])
+
+
+def _evolve(rng, model, generations, population_size, mode, patience, mutation_rate, elite_size,
+            progress=None, stats=None):
+    """
+    Runs the constructive / evolutionary search on grids.
+    Returns (best_score, best_grid), or (None, None) when nothing feasible was found.
+    stats (see _search) is updated in place.
+    """
+    if stats is None:
+        stats = dict(place_doubles=0.0, random_fill=0.0, scoring=0.0,
+                     attempts=0, feasible_attempts=0, rejected_placements=0)
+    encoding = model.encoding
+
+    def construct():
+        grid = _construct_schedule(rng, model, stats)
+        stats['attempts'] += 1
+        if grid is not None:
+            stats['feasible_attempts'] += 1
+        return grid
+
+    def score(grids):
+        started = time.perf_counter()
+        scores = score_population(grids, model.objective)
+        stats['scoring'] += time.perf_counter() - started
+        return scores
+
+    if mode == "restarts":
+        # Increase attempts to find a valid schedule if constraints are tight
+        attempts = max(population_size * 10, 200)
+        candidates = [g for g in (construct() for _ in range(attempts)) if g is not None]
+        if not candidates:
+            return None, None
+        scores = score(candidates)
+        best_idx = max(range(len(candidates)), key=scores.__getitem__)
+        if progress is not None:
+            progress(0, scores[best_idx])
+        return scores[best_idx], candidates[best_idx]
+
+    if mode != "evolve":
+        raise ValueError(f"Unknown mode '{mode}'")
+
+    population_size = max(population_size, 2)
+    if patience is None:
+        patience = max(10, generations // 5)
+
+    # 1. Initial population of feasible random constructions
+    initial = []
+    attempts = max(population_size * 10, 200)
     for _ in range(attempts):
-        current_schedule = []
-        available_slots = all_slots.copy()
-        current_credits = credits.copy()
-        
-        # Ensure ML & AI credits are handled as 4
-        if 'ML & AI' in current_credits:
-            current_credits['ML & AI'] = 4
-
-        shuffled_high_priority = list(high_priority_subjects)
-        random.shuffle(shuffled_high_priority)
-        
-        time_idx_map = {t: i for i, t in enumerate(timeslots)} # Ensure time_idx_map is available here
-
-        # 1. Attempt to place ONE consecutive double for High Priority subjects
-        for subj in shuffled_high_priority:
-            if current_credits.get(subj, 0) < 2:
-                continue
-            
-            # Find a day with 2 consecutive VALID slots
-            shuffled_days = days.copy()
-            random.shuffle(shuffled_days)
-            
-            placed_block = False
-            for day in shuffled_days:
-                # Find all available slots for this day that are valid
-                day_slots = []
-                for i, (d, t) in enumerate(available_slots):
-                    if d == day and (d, t) not in invalid_slots.get(subj, set()):
-                        day_slots.append({'index': i, 'time': t})
-                
-                if len(day_slots) < 2:
-                    continue
-                
-                # Sort by time index
-                day_slots.sort(key=lambda x: time_idx_map.get(x['time'], 0))
-                
-                # Find consecutive pair
-                for k in range(len(day_slots) - 1):
-                    s1 = day_slots[k]
-                    s2 = day_slots[k+1]
-                    
-                    if time_idx_map[s1['time']] + 1 == time_idx_map[s2['time']]:
-                        # Found a pair!
-                        current_schedule.append({"day": day, "timeslot": s1['time'], "subject": subj})
-                        current_schedule.append({"day": day, "timeslot": s2['time'], "subject": subj})
-                        
-                        # Remove from available (higher index first)
-                        indices_to_remove = sorted([s1['index'], s2['index']], reverse=True)
-                        available_slots.pop(indices_to_remove[0])
-                        available_slots.pop(indices_to_remove[1])
-                        
-                        current_credits[subj] -= 2
-                        placed_block = True
-                        break
-                
-                if placed_block:
-                    break # Move to next priority subject
-        
-        # 2. Assign remaining credits normally (Random logic)
-        remaining_pool = []
-        for subj, count in current_credits.items():
-            remaining_pool.extend([subj] * count)
-        
-        random.shuffle(remaining_pool)
-        random.shuffle(available_slots)
-        
-        possible_rest = True
-        for subj in remaining_pool:
-            assigned = False
-            constraints = invalid_slots.get(subj, set())
-            
-            # Count existing assignments for this subject on each day
-            subject_day_counts = {}
-            for entry in current_schedule:
-                if entry['subject'] == subj:
-                    subject_day_counts[entry['day']] = subject_day_counts.get(entry['day'], 0) + 1
-
-            for i, (day, time) in enumerate(available_slots):
-                # Strict Limit: At most 2 lectures per day
-                if subject_day_counts.get(day, 0) < 2 and (day, time) not in constraints:
-                    current_schedule.append({"day": day, "timeslot": time, "subject": subj})
-                    available_slots.pop(i)
-                    assigned = True
-                    break
-            
-            if not assigned:
-                possible_rest = False
+        candidate = construct()
+        if candidate is not None:
+            initial.append(candidate)
+            if len(initial) >= population_size:
                 break
-        
-        if possible_rest:
-            score = calculate_distribution_score(current_schedule)
-            if score > best_score:
-                best_score = score
-                best_schedule = current_schedule
-    
-    return best_schedule
+
+    if not initial:
+        return None, None
+
+    population = list(zip(score(initial), initial))
+    population.sort(key=lambda c: c[0], reverse=True)
+    best_score, best_grid = population[0]
+    stale = 0
+    if progress is not None:
+        progress(0, best_score)
+
+    # 2. Evolve
+    for generation in range(1, generations + 1):
+        children = []
+        while len(children) < population_size - elite_size:
+            parent_a = _tournament(rng, population)
+            parent_b = _tournament(rng, population)
+            child = _crossover(rng, parent_a, parent_b, encoding)
+            if rng.random() < mutation_rate:
+                child = _mutate(rng, child)
+            child = _repair(rng, child, model)
+            stats['attempts'] += 1
+            if child is None:
+                stats['rejected_placements'] += 1
+                # Repair got stuck: fall back to a copy of the first parent
+                child = array('h', parent_a)
+            else:
+                stats['feasible_attempts'] += 1
+            children.append(child)
+
+        # Score the whole generation in one vectorized pass
+        next_population = population[:elite_size] + list(zip(score(children), children))
+        population = sorted(next_population, key=lambda c: c[0], reverse=True)
+        if population[0][0] > best_score:
+            best_score, best_grid = population[0]
+            stale = 0
+        else:
+            stale += 1
+
+        if progress is not None:
+            progress(generation, best_score)
+        if stale >= patience:
+            break
+
+    return best_score, best_grid
+
+
+def _search_seeded(seed, payload, options):
+    # Module-level so it can be pickled into worker processes; payload is the pickled ProblemModel.
+    # Also returns the search's counters: the worker's own metrics never reach the parent.
+    before = metrics.snapshot()[1]
+    best_score, schedule = _search(random.Random(seed), pickle.loads(payload), **options)
+    after = metrics.snapshot()[1]
+    return best_score, schedule, {name: after.get(name, 0) - before.get(name, 0) for name in _SEARCH_COUNTERS}
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown_workers():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _search_parallel(workers, seed, model, options):
+    """
+    Runs `workers` independent searches of `model` on a shared process pool, worker
+    i seeded with seed + i, and reduces to the best (score, schedule). Ties go to
+    the lowest worker index so a given seed always gives the same result.
+    The model is pickled once and the same bytes are sent to every worker.
+    The workers' attempt counters are added to this process's metrics.
+    """
+    payload = pickle.dumps(model, pickle.HIGHEST_PROTOCOL)
+    try:
+        executor = _get_executor(workers)
+        futures = [executor.submit(_search_seeded, seed + i, payload, options) for i in range(workers)]
+        results = [f.result() for f in futures]
+    except BrokenProcessPool:
+        # A worker died (OOM, killed...): drop the pool and search in-process
+        shutdown_workers()
+        results = [_search(random.Random(seed + i), model, **options) + ({},) for i in range(workers)]
+
+    best_score, best_schedule = None, []
+    for score, schedule, counters in results:
+        for name, value in counters.items():
+            metrics.incr(name, value)
+        if score is not None and (best_score is None or score > best_score):
+            best_score, best_schedule = score, schedule
+    return best_score, best_schedule
+
+
+def optimize_schedule(schedule, timeslots, priorities, credits, invalid_slots=None, budget_ms=200, seed=None,
+                      rules=None):
+    """
+    Post-optimizes an existing feasible schedule with simulated annealing for
+    `budget_ms` milliseconds under the school's rules, respecting invalid_slots and the
+    per-day limit.
+    Returns (improved_schedule, trajectory) where trajectory is a list of
+    (elapsed_ms, best_score).
+    """
+    subjects = [entry['subject'] for entry in schedule]
+    model = ProblemModel(subjects, timeslots, priorities, credits, invalid_slots, rules)
+    best_grid, trajectory = anneal(model.encoding.encode(schedule), model.index, model.objective, budget_ms,
+                                   random.Random(seed))
+    return model.encoding.decode(best_grid), trajectory
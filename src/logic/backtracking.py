@@ -0,0 +1,152 @@
+import time
+
+from src.logic.encoding import EMPTY
+from src.logic.feasibility import _max_flow, lowest_bit, popcount
+
+# Check the clock every this many nodes
+_CLOCK_INTERVAL = 256
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def backtrack(index, target, rng, node_limit=20000, time_limit_ms=500):
+    """
+    Depth-first search that places one lecture per node.
+    - Variable order: the subject with the least slack (open capacity this week
+      minus lectures still to place) goes next, i.e. most constrained first.
+    - Value order: days where the subject has no lecture yet first, then slots
+      next to its lecture of the day, random among equals.
+    - Forward checking: after each placement every subject must still have room
+      for its remaining lectures under teacher availability / breaks (index) and
+      the per-day limit, and all remaining lectures together must fit in the
+      cells still open to them, otherwise the branch is cut right away. Once the
+      search starts backtracking, an exact max-flow check (as in
+      feasibility.analyze) runs at every node as well.
+    Returns (grid, status) with status 'solved', 'exhausted' (no timetable
+    exists) or 'budget' (node_limit nodes or time_limit_ms spent; grid is None).
+    """
+    encoding = index.encoding
+    n_days, n_slots = index.n_days, index.n_slots
+    subjects = [sid for sid in range(encoding.n_subjects) if target[sid] > 0]
+    valid = index.valid
+    limit = index.max_per_day
+
+    grid = encoding.empty()
+    free = [index.full_day] * n_days
+    day_counts = [[0] * n_days for _ in range(encoding.n_subjects)]
+    remaining = list(target)
+    # Random tie-break between equally constrained subjects
+    tie = {sid: rng.random() for sid in subjects}
+    lectures = sum(target[sid] for sid in subjects)
+    nodes = [0]
+    deadline = time.perf_counter() + time_limit_ms / 1000.0
+
+    def capacity(sid):
+        counts = day_counts[sid]
+        return sum(min(limit - counts[d], popcount(valid[sid][d] & free[d]))
+                   for d in range(n_days) if counts[d] < limit)
+
+    def matchable(pending):
+        # Exact check: max flow of the remaining lectures into the free cells
+        graph = {'s': {}, 't': {}}
+        for sid in subjects:
+            if not remaining[sid]:
+                continue
+            graph['s'][sid] = remaining[sid]
+            graph[sid] = {}
+            for d in range(n_days):
+                mask = valid[sid][d] & free[d]
+                if not mask or day_counts[sid][d] >= limit:
+                    continue
+                day_node = (sid, d)
+                graph[sid][day_node] = limit - day_counts[sid][d]
+                graph[day_node] = {}
+                while mask:
+                    k = lowest_bit(mask)
+                    mask &= mask - 1
+                    cell = ('cell', d * n_slots + k)
+                    graph[day_node][cell] = 1
+                    graph.setdefault(cell, {})['t'] = 1
+        return _max_flow(graph, 's', 't') == pending
+
+    def candidates(sid):
+        counts = day_counts[sid]
+        ranked = []
+        for d in range(n_days):
+            if counts[d] >= limit:
+                continue
+            mask = valid[sid][d] & free[d]
+            # Slots next to the subject's lecture on this day (split pairs are penalised)
+            beside = 0
+            if counts[d]:
+                for k in range(n_slots):
+                    if grid[d * n_slots + k] == sid:
+                        beside |= (1 << (k + 1)) | (1 << k >> 1)
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                preference = (counts[d], 0 if bit & beside else 1, rng.random())
+                ranked.append((preference, d, bit.bit_length() - 1))
+        ranked.sort()
+        return ranked
+
+    def search():
+        nodes[0] += 1
+        if nodes[0] > node_limit:
+            raise _BudgetExceeded()
+        if nodes[0] % _CLOCK_INTERVAL == 0 and time.perf_counter() > deadline:
+            raise _BudgetExceeded()
+
+        best = None
+        pending = 0
+        open_cells = [0] * n_days
+        for sid in subjects:
+            if remaining[sid]:
+                slack = capacity(sid) - remaining[sid]
+                if slack < 0:
+                    return False
+                key = (slack, tie[sid])
+                if best is None or key < best[0]:
+                    best = (key, sid)
+                pending += remaining[sid]
+                counts = day_counts[sid]
+                for d in range(n_days):
+                    if counts[d] < limit:
+                        open_cells[d] |= valid[sid][d] & free[d]
+        if best is None:
+            return True
+        # All remaining lectures together must still fit in the cells open to them
+        if sum(popcount(mask) for mask in open_cells) < pending:
+            return False
+        # The exact check costs a max flow per node, so it only starts once the
+        # counting checks alone have needed more nodes than there are lectures
+        if nodes[0] > lectures and not matchable(pending):
+            return False
+        sid = best[1]
+
+        for _, d, k in candidates(sid):
+            bit = 1 << k
+            grid[d * n_slots + k] = sid
+            free[d] ^= bit
+            day_counts[sid][d] += 1
+            remaining[sid] -= 1
+
+            # Forward check the subjects that could have used this slot
+            ok = all(capacity(other) >= remaining[other]
+                     for other in subjects if remaining[other] and valid[other][d] & bit)
+            if ok and (not remaining[sid] or capacity(sid) >= remaining[sid]) and search():
+                return True
+
+            grid[d * n_slots + k] = EMPTY
+            free[d] ^= bit
+            day_counts[sid][d] -= 1
+            remaining[sid] += 1
+        return False
+
+    try:
+        solved = search()
+    except _BudgetExceeded:
+        return None, 'budget'
+    return (grid, 'solved') if solved else (None, 'exhausted')
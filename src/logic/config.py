@@ -9,4 +9,38 @@ class Config:
     DB_USER = os.environ.get('DB_USER', 'root')
     DB_PASSWORD = os.environ.get('DB_PASSWORD')
     DB_NAME = os.environ.get('DB_NAME', 'timetabledb')
-    DB_PORT = int(os.environ.get('DB_PORT', '3306'))
\ No newline at end of file
+    DB_PORT = int(os.environ.get('DB_PORT', '3306'))
+    # Connection pool: max connections per app process and seconds to wait for a free one
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+    # Timetable engine: 'genetic' (stochastic search) or 'backtracking' (exact search,
+    # falls back to 'genetic' after BACKTRACK_NODE_LIMIT placements or BACKTRACK_TIME_MS)
+    GENERATION_ENGINE = os.environ.get('GENERATION_ENGINE', 'genetic')
+    BACKTRACK_NODE_LIMIT = int(os.environ.get('BACKTRACK_NODE_LIMIT', '20000'))
+    BACKTRACK_TIME_MS = int(os.environ.get('BACKTRACK_TIME_MS', '500'))
+    # Number of worker processes used by the genetic engine (1 = search in the request thread)
+    GENERATION_WORKERS = int(os.environ.get('GENERATION_WORKERS', '1'))
+    # Milliseconds of simulated annealing run on each search's best timetable (0 = off)
+    LOCAL_SEARCH_MS = int(os.environ.get('LOCAL_SEARCH_MS', '0'))
+    # Background generation jobs: worker threads, the SQLite job store shared by every app
+    # process ('memory' = per-process dict, single-process servers only) and seconds
+    # finished jobs are kept
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+    JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH') or os.path.join('instance', 'jobs.db')
+    JOB_TTL = float(os.environ.get('JOB_TTL', '86400'))
+    # Generated / modified timetables kept server-side for the session: SQLite file shared
+    # by every app process ('memory' = per-process dict) and seconds they are kept
+    RESULT_STORE_PATH = os.environ.get('RESULT_STORE_PATH') or os.path.join('instance', 'results.db')
+    RESULT_TTL = float(os.environ.get('RESULT_TTL', '86400'))
+    # Optional bearer token required by /metrics (empty = open, e.g. behind a private network)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # Debug log of each generation's inputs (e.g. debug_gen.log); empty = off
+    GENERATION_DEBUG_LOG = os.environ.get('GENERATION_DEBUG_LOG', '')
+    # Opt-in cProfile of single /generate or /regenerate_quick requests ("profile" flag):
+    # off unless enabled, newest PROFILE_KEEP profiles kept in PROFILE_DIR
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '20'))
+    # Public /get_timetable cache: max entries and seconds before an entry is re-read
+    TIMETABLE_CACHE_SIZE = int(os.environ.get('TIMETABLE_CACHE_SIZE', '256'))
+    TIMETABLE_CACHE_TTL = float(os.environ.get('TIMETABLE_CACHE_TTL', '60'))
@@ -0,0 +1,106 @@
+from datetime import time as dt_time, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+
+
+def _minutes(value):
+    """
+    Minutes since midnight of a time given as 'H:MM', 'HH:MM:SS', timedelta (MySQL
+    TIME) or datetime.time. None / '' / 'None' mean "not set" and give None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, dt_time):
+        return value.hour * 60 + value.minute
+    value = str(value).strip()
+    if value in ('', 'None'):
+        return None
+    parts = value.split(':')
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def _clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+class DaySchedule:
+    """
+    The lecture / break layout of one school day, built from a time configuration
+    (start_time, end_time, lecture_duration, break_start, break_duration).
+    Immutable and shared: get one through day_schedule(config).
+
+    timeslots       every slot start in order, breaks included ('HH:MM:SS')
+    kinds           'lecture' or 'break' for each entry of timeslots
+    lecture_slots   / break_slots: the timeslots of that kind
+    slot_index      timeslot -> position in timeslots
+    consecutive     (earlier, later) lecture pairs that run back to back, i.e.
+                    not split by the break
+
+    A lecture that would overlap the start of the break is pushed after it and a
+    break entry is put in its place, so lectures on either side of the break are
+    never neighbours in timeslots.
+    """
+
+    __slots__ = ('timeslots', 'kinds', 'lecture_slots', 'break_slots', 'slot_index', 'consecutive')
+
+    def __init__(self, start, end, duration, break_start, break_duration):
+        timeslots = []
+        kinds = []
+        ends = []
+        break_end = break_start + break_duration if break_start is not None and break_duration else None
+
+        current = start
+        while duration > 0 and current + duration <= end:
+            if break_end is not None and current < break_end and current + duration > break_start:
+                # Lands in the break or overlaps its start: one break entry, then resume after it
+                timeslots.append(_clock(current if current >= break_start else break_start))
+                kinds.append('break')
+                ends.append(break_end)
+                current = break_end
+                continue
+            timeslots.append(_clock(current))
+            kinds.append('lecture')
+            ends.append(current + duration)
+            current += duration
+
+        self.timeslots = tuple(timeslots)
+        self.kinds = tuple(kinds)
+        self.lecture_slots = tuple(t for t, kind in zip(timeslots, kinds) if kind == 'lecture')
+        self.break_slots = tuple(t for t, kind in zip(timeslots, kinds) if kind == 'break')
+        self.slot_index = MappingProxyType({t: i for i, t in enumerate(timeslots)})
+        self.consecutive = frozenset(
+            (timeslots[i], timeslots[i + 1]) for i in range(len(timeslots) - 1)
+            if kinds[i] == kinds[i + 1] == 'lecture' and ends[i] == _minutes(timeslots[i + 1])
+        )
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("DaySchedule is immutable")
+        object.__setattr__(self, name, value)
+
+    def visual_slots(self):
+        """The [{'time', 'type'}] list the templates render (a fresh copy)."""
+        return [{'time': t, 'type': kind} for t, kind in zip(self.timeslots, self.kinds)]
+
+
+@lru_cache(maxsize=256)
+def _cached_day_schedule(start, end, duration, break_start, break_duration):
+    return DaySchedule(start, end, duration, break_start, break_duration)
+
+
+def day_schedule(config):
+    """
+    The DaySchedule of a time configuration dict. Values may come from the session
+    (strings), the schools table or a form; equal configurations share one cached
+    object. Raises ValueError if start_time or end_time is missing.
+    """
+    start = _minutes(config.get('start_time'))
+    end = _minutes(config.get('end_time'))
+    if start is None or end is None:
+        raise ValueError("Time configuration needs a start_time and an end_time")
+    duration = int(config.get('lecture_duration') or 60)
+    break_start = _minutes(config.get('break_start'))
+    break_duration = int(config.get('break_duration') or 0)
+    return _cached_day_schedule(start, end, duration, break_start, break_duration)
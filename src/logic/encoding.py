@@ -0,0 +1,83 @@
+from array import array
+
+import numpy as np
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+# Grid value for a cell with no lecture
+EMPTY = -1
+
+
+class ScheduleEncoding:
+    """
+    Interns subjects, days and timeslots to small ints so a schedule can be stored
+    as a flat array('h') grid of (day x slot) -> subject id (EMPTY if free).
+    Cell index = day_idx * n_slots + slot_idx.
+    The dict format ({"day", "timeslot", "subject"}) is only used at the boundary.
+    """
+
+    def __init__(self, subjects, timeslots, priorities, high_priority_subjects, days=DAYS):
+        self.subjects = list(dict.fromkeys(subjects))
+        self.days = list(days)
+        self.timeslots = list(timeslots)
+
+        self.subject_ids = {s: i for i, s in enumerate(self.subjects)}
+        self.day_ids = {d: i for i, d in enumerate(self.days)}
+        self.slot_ids = {t: i for i, t in enumerate(self.timeslots)}
+
+        self.n_subjects = len(self.subjects)
+        self.n_days = len(self.days)
+        self.n_slots = len(self.timeslots)
+        self.size = self.n_days * self.n_slots
+
+        # Per-subject scoring inputs, indexed by subject id
+        self.priority = [priorities.get(s, 1) for s in self.subjects]
+        self.high_priority = [s in high_priority_subjects for s in self.subjects]
+
+    def cell(self, day, timeslot):
+        return self.day_ids[day] * self.n_slots + self.slot_ids[timeslot]
+
+    def empty(self):
+        return array('h', [EMPTY]) * self.size
+
+    def cell_mask(self, cells_by_subject):
+        """
+        Converts {subject: iterable of (day, time_str)} into one bytearray per
+        subject id, with 1 for cells listed for that subject.
+        Unknown days/timeslots are ignored.
+        """
+        masks = [bytearray(self.size) for _ in range(self.n_subjects)]
+        for subj, cells in cells_by_subject.items():
+            sid = self.subject_ids.get(subj)
+            if sid is None:
+                continue
+            for day, timeslot in cells:
+                if day in self.day_ids and timeslot in self.slot_ids:
+                    masks[sid][self.cell(day, timeslot)] = 1
+        return masks
+
+    def encode(self, schedule):
+        grid = self.empty()
+        for entry in schedule:
+            grid[self.cell(entry['day'], entry['timeslot'])] = self.subject_ids[entry['subject']]
+        return grid
+
+    def decode(self, grid):
+        schedule = []
+        for c, sid in enumerate(grid):
+            if sid != EMPTY:
+                day_idx, slot_idx = divmod(c, self.n_slots)
+                schedule.append({
+                    "day": self.days[day_idx],
+                    "timeslot": self.timeslots[slot_idx],
+                    "subject": self.subjects[sid],
+                })
+        return schedule
+
+    def to_numpy(self, grids):
+        """
+        Stacks grids into a (candidate x day x slot) int16 array without a Python
+        level copy of every cell.
+        """
+        buf = b"".join(g.tobytes() for g in grids)
+        return np.frombuffer(buf, dtype=np.int16).reshape(len(grids), self.n_days, self.n_slots)
@@ -0,0 +1,195 @@
+import time
+from collections import deque
+
+from src.logic.encoding import EMPTY
+
+# Default limit of lectures of one subject per day (rules.RULES['max_per_day'])
+MAX_PER_DAY = 2
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+class FeasibilityIndex:
+    """
+    Per-subject feasibility bitmasks over the (day x slot) grid, built once per
+    call from invalid_slots. valid[sid][day] has bit k set when slot k on that day
+    is allowed for the subject (teacher free, not a break); valid_cells[sid] is the
+    same information as one flat mask over cell indices. max_per_day is the
+    most lectures of one subject allowed on a day.
+    Free cells of a grid are tracked as one bitmask per day, so placement checks are
+    bitwise ANDs instead of scans over slot lists.
+    """
+
+    def __init__(self, encoding, invalid_slots, max_per_day=MAX_PER_DAY):
+        self.encoding = encoding
+        self.max_per_day = max_per_day
+        self.n_days = encoding.n_days
+        self.n_slots = encoding.n_slots
+        self.full_day = (1 << encoding.n_slots) - 1
+
+        self.valid = [[self.full_day] * encoding.n_days for _ in range(encoding.n_subjects)]
+        for sid, blocked in enumerate(encoding.cell_mask(invalid_slots)):
+            day_masks = self.valid[sid]
+            for c, is_blocked in enumerate(blocked):
+                if is_blocked:
+                    day_idx, slot_idx = divmod(c, self.n_slots)
+                    day_masks[day_idx] &= ~(1 << slot_idx)
+
+        self.valid_cells = [
+            sum(mask << (day_idx * self.n_slots) for day_idx, mask in enumerate(day_masks))
+            for day_masks in self.valid
+        ]
+
+    def day_capacity(self, sid):
+        """Most lectures of sid that fit in a week, ignoring other subjects."""
+        return sum(min(self.max_per_day, popcount(mask)) for mask in self.valid[sid])
+
+    def is_valid(self, sid, cell):
+        return (self.valid_cells[sid] >> cell) & 1 == 1
+
+    def free_masks(self, grid):
+        free = [0] * self.n_days
+        n_slots = self.n_slots
+        for c, sid in enumerate(grid):
+            if sid == EMPTY:
+                day_idx, slot_idx = divmod(c, n_slots)
+                free[day_idx] |= 1 << slot_idx
+        return free
+
+    def consecutive_pairs(self, sid, day_idx, free_mask):
+        """
+        Bit k is set when slots k and k+1 on the day are both free and valid for sid.
+        """
+        available = self.valid[sid][day_idx] & free_mask
+        return available & (available >> 1)
+
+
+def _max_flow(graph, source, sink):
+    """
+    Unit-augmenting max flow (Edmonds-Karp) on {node: {neighbour: capacity}};
+    graph is modified into the residual graph. Fine for the few hundred edges
+    of one class timetable.
+    """
+    flow = 0
+    while True:
+        parent = {source: None}
+        queue = deque([source])
+        while queue and sink not in parent:
+            node = queue.popleft()
+            for nxt, cap in graph[node].items():
+                if cap > 0 and nxt not in parent:
+                    parent[nxt] = node
+                    queue.append(nxt)
+        if sink not in parent:
+            return flow
+        node = sink
+        while parent[node] is not None:
+            prev = parent[node]
+            graph[prev][node] -= 1
+            graph[node][prev] = graph[node].get(prev, 0) + 1
+            node = prev
+        flow += 1
+
+
+def placement_order(index, target):
+    """Subject ids with lectures to place, least slack (week capacity - lectures) first."""
+    subjects = [sid for sid in range(index.encoding.n_subjects) if target[sid] > 0]
+    return sorted(subjects, key=lambda sid: (index.day_capacity(sid) - target[sid], sid))
+
+
+def analyze(index, target):
+    """
+    Decides before any search whether the lectures in `target` (subject id ->
+    weekly count) can be placed at all, given teacher availability / breaks
+    (index) and the per-day limit (index.max_per_day).
+    Cheap counting checks run first; if they pass, lectures are matched to cells
+    with a max flow (source -> subject -> (subject, day) -> cell -> sink), which is
+    exact for these hard constraints.
+    Returns a report dict:
+        feasible, lectures, open_cells, elapsed_ms,
+        problems: [{kind, subjects, needed, available, message}],
+        order: subject ids, tightest (least slack) first
+    """
+    started = time.perf_counter()
+    encoding = index.encoding
+    names = encoding.subjects
+    subjects = [sid for sid in range(encoding.n_subjects) if target[sid] > 0]
+    problems = []
+
+    def problem(kind, sids, needed, available, message):
+        problems.append({'kind': kind, 'subjects': [names[sid] for sid in sids],
+                         'needed': needed, 'available': available, 'message': message})
+
+    for sid in subjects:
+        slots = popcount(index.valid_cells[sid])
+        fits = index.day_capacity(sid)
+        if slots < target[sid]:
+            problem('subject_slots', [sid], target[sid], slots,
+                    f"{names[sid]} needs {target[sid]} lectures but only {slots} slots are open to it")
+        elif fits < target[sid]:
+            days = sum(1 for mask in index.valid[sid] if mask)
+            problem('subject_days', [sid], target[sid], fits,
+                    f"{names[sid]} needs {target[sid]} lectures at most {index.max_per_day} a day, "
+                    f"but only {days} day{'s' if days != 1 else ''} {'have' if days != 1 else 'has'} open slots for it")
+
+    lectures = sum(target[sid] for sid in subjects)
+    open_mask = 0
+    for sid in subjects:
+        open_mask |= index.valid_cells[sid]
+    open_cells = popcount(open_mask)
+    if lectures > open_cells:
+        problem('capacity', subjects, lectures, open_cells,
+                f"{lectures} lectures are needed but the week only has {open_cells} usable slots")
+
+    if not problems:
+        # source -> subject (target) -> (subject, day) (2) -> cell (1) -> sink (1)
+        graph = {'s': {}, 't': {}}
+        n_slots = index.n_slots
+        for sid in subjects:
+            graph['s'][('sub', sid)] = target[sid]
+            graph[('sub', sid)] = {}
+            for day_idx, mask in enumerate(index.valid[sid]):
+                if not mask:
+                    continue
+                day_node = ('day', sid, day_idx)
+                graph[('sub', sid)][day_node] = index.max_per_day
+                graph[day_node] = {}
+                while mask:
+                    slot_idx = lowest_bit(mask)
+                    mask &= mask - 1
+                    cell = ('cell', day_idx * n_slots + slot_idx)
+                    graph[day_node][cell] = 1
+                    graph.setdefault(cell, {})['t'] = 1
+
+        placed = _max_flow(graph, 's', 't')
+        if placed < lectures:
+            # Subjects still reachable from the source compete for too few cells (Hall's condition)
+            reachable = {'s'}
+            queue = deque(['s'])
+            while queue:
+                node = queue.popleft()
+                for nxt, cap in graph[node].items():
+                    if cap > 0 and nxt not in reachable:
+                        reachable.add(nxt)
+                        queue.append(nxt)
+            stuck = [sid for sid in subjects if ('sub', sid) in reachable]
+            needed = sum(target[sid] for sid in stuck)
+            available = needed - sum(graph['s'][('sub', sid)] for sid in stuck)
+            problem('matching', stuck, needed, available,
+                    f"{', '.join(names[sid] for sid in stuck)} need {needed} lectures together "
+                    f"but only {available} fit in the slots open to them")
+
+    return {
+        'feasible': not problems,
+        'lectures': lectures,
+        'open_cells': open_cells,
+        'problems': problems,
+        'order': placement_order(index, target),
+        'elapsed_ms': (time.perf_counter() - started) * 1000.0,
+    }
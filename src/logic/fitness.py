@@ -0,0 +1,164 @@
+import numpy as np
+
+from src.logic.encoding import EMPTY
+from src.logic.feasibility import popcount
+
+
+def batch_scores(population, objective):
+    """
+    Scores a whole population at once under a compiled rules.Objective.
+    population: (candidate x day x slot) int array as built by ScheduleEncoding.to_numpy.
+    Returns an int64 array of scores, identical to objective.score for every candidate.
+    """
+    grid = np.asarray(population, dtype=np.int64)
+    if grid.ndim == 2:
+        grid = grid[None]
+    encoding = objective.encoding
+    n_slots = encoding.n_slots
+    subject_ids = np.arange(encoding.n_subjects)
+    tables = objective.tables()
+
+    # Per-lecture priority reward
+    scores = tables['lecture_value'][grid].sum(axis=(1, 2))
+
+    # Consecutive high priority lectures (EMPTY pairs look up a 0 bonus)
+    same_as_prev = grid[:, :, 1:] == grid[:, :, :-1]
+    scores += (same_as_prev * tables['pair_bonus'][grid[:, :, 1:]]).sum(axis=(1, 2))
+
+    # (candidate, day, slot, subject) membership -> per (candidate, day, subject) aggregates
+    onehot = grid[..., None] == subject_ids
+    counts = onehot.sum(axis=2)
+    first = onehot.argmax(axis=2)
+    last = n_slots - 1 - onehot[:, :, ::-1, :].argmax(axis=2)
+
+    present = counts > 0
+    limit = objective.limit
+    # Variety plus spreading bonus per subject on the day
+    terms = objective.day_value * present
+    terms -= np.where(counts > limit, (counts - limit) * objective.overload, 0)
+    terms -= np.where((counts >= 2) & (counts <= limit), tables['repeat_penalty'], 0)
+    terms -= np.where((counts >= 2) & (last - first != counts - 1), objective.gap * counts, 0)
+    if tables['day_bonus'] is not None:
+        terms += counts * tables['day_bonus']
+    scores += terms.sum(axis=(1, 2))
+
+    longest = objective.teacher_max
+    if objective.teacher_weight and longest < n_slots:
+        # Windows of longest + 1 consecutive slots all taught by the same teacher
+        teacher = tables['teacher_of'][grid]
+        width = n_slots - longest
+        for t_idx, busy in enumerate(tables['teacher_busy']):
+            taught = (teacher == t_idx) | busy
+            run = taught[:, :, :width]
+            for shift in range(1, longest + 1):
+                run = run & taught[:, :, shift:shift + width]
+            scores -= objective.teacher_weight * (run.sum(axis=(1, 2)) - tables['teacher_base'][t_idx])
+
+    return scores
+
+
+def score_population(grids, objective):
+    """
+    Convenience wrapper: scores a list of array('h') grids and returns plain ints.
+    """
+    if not grids:
+        return []
+    return batch_scores(objective.encoding.to_numpy(grids), objective).tolist()
+
+
+class IncrementalScore:
+    """
+    Keeps the score of one grid up to date under local moves.
+    For every (day, subject) it stores the bitmask of slots the subject occupies
+    that day; count, first/last slot and adjacent pairs all derive from that mask,
+    so a move only re-scores the (day, subject) terms it touches instead of the
+    whole week (plus the touched (day, teacher) terms when the objective has them).
+    The total always equals objective.score(grid).
+    """
+
+    def __init__(self, grid, objective):
+        self.grid = grid
+        self.objective = objective
+        encoding = objective.encoding
+        self.n_slots = encoding.n_slots
+        self._term = objective.term
+
+        self.masks = [[0] * encoding.n_subjects for _ in range(encoding.n_days)]
+        for c, sid in enumerate(grid):
+            if sid != EMPTY:
+                day_idx, slot_idx = divmod(c, self.n_slots)
+                self.masks[day_idx][sid] |= 1 << slot_idx
+
+        self.terms = [[self._term(d, sid, mask) for sid, mask in enumerate(day)] for d, day in enumerate(self.masks)]
+        self.teacher_terms = [
+            [objective.teacher_term(d, t, objective.teacher_mask(d, t, day)) for t in range(len(objective.teacher_subjects))]
+            for d, day in enumerate(self.masks)
+        ] if objective.teacher_weight else None
+        self.score = sum(sum(day) for day in self.terms) + sum(sum(day) for day in self.teacher_terms or ())
+
+    def day_count(self, day_idx, sid):
+        return popcount(self.masks[day_idx][sid])
+
+    def _swapped_masks(self, c1, c2):
+        grid = self.grid
+        a, b = grid[c1], grid[c2]
+        changed = {}
+        if a == b:
+            return changed
+        d1, k1 = divmod(c1, self.n_slots)
+        d2, k2 = divmod(c2, self.n_slots)
+        if a != EMPTY:
+            changed[(d1, a)] = self.masks[d1][a] & ~(1 << k1)
+            changed[(d2, a)] = changed.get((d2, a), self.masks[d2][a]) | (1 << k2)
+        if b != EMPTY:
+            changed[(d2, b)] = changed.get((d2, b), self.masks[d2][b]) & ~(1 << k2)
+            changed[(d1, b)] = changed.get((d1, b), self.masks[d1][b]) | (1 << k1)
+        return changed
+
+    def _teacher_changes(self, changed):
+        # (day, teacher) -> new teacher mask, for the teachers of the changed subjects
+        objective = self.objective
+        teachers = {}
+        for d, sid in changed:
+            t = objective.teacher_of[sid]
+            if t < 0 or (d, t) in teachers:
+                continue
+            masks = self.masks[d]
+            mask = objective.teacher_busy[t][d]
+            for s in objective.teacher_subjects[t]:
+                mask |= changed.get((d, s), masks[s])
+            teachers[(d, t)] = mask
+        return teachers
+
+    def swap_delta(self, c1, c2):
+        """
+        Score change if the contents of cells c1 and c2 were exchanged (either may be
+        EMPTY, which makes it a move). Does not modify anything.
+        """
+        changed = self._swapped_masks(c1, c2)
+        delta = sum(self._term(d, sid, mask) - self.terms[d][sid] for (d, sid), mask in changed.items())
+        if self.teacher_terms is not None:
+            teacher_term = self.objective.teacher_term
+            delta += sum(teacher_term(d, t, mask) - self.teacher_terms[d][t]
+                         for (d, t), mask in self._teacher_changes(changed).items())
+        return delta
+
+    def swap(self, c1, c2):
+        """
+        Exchanges cells c1 and c2 in the grid and updates the score. Returns the delta.
+        """
+        delta = 0
+        changed = self._swapped_masks(c1, c2)
+        teachers = self._teacher_changes(changed) if self.teacher_terms is not None else {}
+        for (d, sid), mask in changed.items():
+            term = self._term(d, sid, mask)
+            delta += term - self.terms[d][sid]
+            self.terms[d][sid] = term
+            self.masks[d][sid] = mask
+        for (d, t), mask in teachers.items():
+            term = self.objective.teacher_term(d, t, mask)
+            delta += term - self.teacher_terms[d][t]
+            self.teacher_terms[d][t] = term
+        self.grid[c1], self.grid[c2] = self.grid[c2], self.grid[c1]
+        self.score += delta
+        return delta
@@ -0,0 +1,90 @@
+import math
+import time
+from array import array
+
+from src.logic.encoding import EMPTY
+from src.logic.fitness import IncrementalScore
+
+# Check the clock every this many moves
+_CLOCK_INTERVAL = 256
+
+
+def _swap_is_feasible(inc, index, c1, c2):
+    """
+    A swap must keep both lectures in slots valid for their subject and respect
+    the lectures-per-day limit (index.max_per_day) on the receiving days.
+    """
+    grid = inc.grid
+    a, b = grid[c1], grid[c2]
+    if a == b:
+        return False
+    n_slots = index.n_slots
+    d1, d2 = c1 // n_slots, c2 // n_slots
+    if a != EMPTY:
+        if not index.is_valid(a, c2):
+            return False
+        if d1 != d2 and inc.day_count(d2, a) >= index.max_per_day:
+            return False
+    if b != EMPTY:
+        if not index.is_valid(b, c1):
+            return False
+        if d1 != d2 and inc.day_count(d1, b) >= index.max_per_day:
+            return False
+    return True
+
+
+def anneal(grid, index, objective, budget_ms, rng, start_temperature=200.0, end_temperature=1.0):
+    """
+    Simulated annealing over swap/move neighbourhoods for at most `budget_ms`.
+    Every accepted move keeps the grid feasible (invalid_slots and the per-day
+    limit), and scores (objective, a compiled rules.Objective) are updated incrementally. The temperature cools geometrically with
+    elapsed time.
+    Returns (best_grid, trajectory) where trajectory is a list of
+    (elapsed_ms, best_score) recorded each time the best score improved.
+    """
+    inc = IncrementalScore(array('h', grid), objective)
+    best_grid = array('h', inc.grid)
+    best_score = inc.score
+    trajectory = [(0.0, best_score)]
+
+    filled = [c for c, sid in enumerate(inc.grid) if sid != EMPTY]
+    if not filled or budget_ms <= 0:
+        return best_grid, trajectory
+
+    size = index.encoding.size
+    budget = budget_ms / 1000.0
+    ratio = end_temperature / start_temperature
+    started = time.perf_counter()
+    temperature = start_temperature
+    moves = 0
+
+    while True:
+        if moves % _CLOCK_INTERVAL == 0:
+            elapsed = time.perf_counter() - started
+            if elapsed >= budget:
+                break
+            temperature = start_temperature * ratio ** (elapsed / budget)
+        moves += 1
+
+        # Move a random lecture into a random cell (swap if that cell is taken)
+        i = rng.randrange(len(filled))
+        c1 = filled[i]
+        c2 = rng.randrange(size)
+        if not _swap_is_feasible(inc, index, c1, c2):
+            continue
+
+        delta = inc.swap_delta(c1, c2)
+        if delta < 0 and rng.random() >= math.exp(delta / temperature):
+            continue
+
+        was_empty = inc.grid[c2] == EMPTY
+        inc.swap(c1, c2)
+        if was_empty:
+            filled[i] = c2
+
+        if inc.score > best_score:
+            best_score = inc.score
+            best_grid = array('h', inc.grid)
+            trajectory.append(((time.perf_counter() - started) * 1000.0, best_score))
+
+    return best_grid, trajectory
@@ -0,0 +1,66 @@
+from src.logic.encoding import ScheduleEncoding
+from src.logic.feasibility import FeasibilityIndex, analyze
+from src.logic.rules import Objective, blocked_slots, day_limit, effective_credits, resolve_rules
+
+
+def get_high_priority_subjects(priorities):
+    # Identify high priority subjects (priority 4 and 5, or just the top tier)
+    max_p = max(priorities.values()) if priorities else 0
+    return {s for s, p in priorities.items() if p >= max(1, max_p - 1)}
+
+
+class ProblemModel:
+    """
+    One timetable problem compiled for the engines, built once per call and only
+    read afterwards by every stage (construction, repair, scoring, local search,
+    backtracking):
+    - rules: the resolved scheduling rules (see rules.resolve_rules)
+    - encoding: subject / day / slot ids, the (day x slot) grid layout and the
+      priority tiers (encoding.priority, encoding.high_priority)
+    - target: weekly lectures per subject id, after credit_overrides
+    - index: per-subject feasibility masks (FeasibilityIndex) with the constraint
+      rules applied. Breaks are cells no subject may use, so neighbouring bits of
+      a day are truly consecutive slots.
+    - objective: the objective rules compiled for this problem (rules.Objective)
+    - the feasibility analysis, computed on first use and kept
+    It holds only plain lists, dicts and small arrays, so it pickles cheaply for
+    worker processes.
+    rules are a school's rule settings (None for the defaults); teachers
+    ({subject: teacher_id}) and teacher_busy ({teacher_id: set((day, time_str))})
+    are only used by the teacher_consecutive rule.
+    """
+
+    def __init__(self, subjects, timeslots, priorities, credits, invalid_slots=None, rules=None, teachers=None,
+                 teacher_busy=None):
+        self.rules = resolve_rules(rules)
+        # Intern everything once; the search works on flat int grids
+        high_priority_subjects = get_high_priority_subjects(priorities)
+        target_credits = effective_credits(credits, self.rules)
+        self.encoding = ScheduleEncoding(list(target_credits) + list(subjects), timeslots, priorities,
+                                         high_priority_subjects)
+        self.target = [target_credits.get(s, 0) for s in self.encoding.subjects]
+        self.lectures = sum(self.target)
+        self.index = FeasibilityIndex(self.encoding, blocked_slots(self.rules, timeslots, invalid_slots or {}),
+                                      day_limit(self.rules, self.encoding.n_slots))
+        self.objective = Objective(self.encoding, self.rules, teachers, teacher_busy)
+        self._analysis = None
+
+    def analysis(self):
+        """feasibility.analyze of the problem (subject ids), computed once."""
+        if self._analysis is None:
+            self._analysis = analyze(self.index, self.target)
+        return self._analysis
+
+    @property
+    def feasible(self):
+        return self.analysis()['feasible']
+
+    def score(self, schedule):
+        """Score of a schedule (list of {"day", "timeslot", "subject"}) under the rules."""
+        return self.objective.score(self.encoding.encode(schedule))
+
+    def report(self):
+        """The analysis with subject names in 'order' (see check_feasibility)."""
+        report = dict(self.analysis())
+        report['order'] = [self.encoding.subjects[sid] for sid in report['order']]
+        return report
@@ -0,0 +1,311 @@
+import copy
+
+import numpy as np
+
+from src.logic.day_schedule import _minutes
+from src.logic.encoding import DAYS, EMPTY
+from src.logic.feasibility import lowest_bit, popcount
+
+# Every scheduling rule a school can configure, and its defaults.
+# kind 'objective': a weighted score term (reward or penalty, the weight is its size).
+# kind 'constraint': a hard rule, compiled into the feasibility masks / credit targets.
+# The other keys of a rule are its parameters. With these defaults the score is
+# exactly calculate_distribution_score.
+RULES = {
+    'priority': {
+        'kind': 'objective', 'enabled': True, 'weight': 2,
+        'description': "Reward per lecture, times the subject's priority",
+    },
+    'doubles': {
+        'kind': 'objective', 'enabled': True, 'weight': 20,
+        'description': "Reward per back-to-back pair of a high priority subject, times its priority",
+    },
+    'variety': {
+        'kind': 'objective', 'enabled': True, 'weight': 100,
+        'description': "Reward per distinct subject on a day",
+    },
+    'spread': {
+        'kind': 'objective', 'enabled': True, 'weight': 30,
+        'description': "Reward per day a subject appears on",
+    },
+    'overload': {
+        'kind': 'objective', 'enabled': True, 'weight': 500,
+        'description': "Penalty per lecture of a subject above the daily limit (edited timetables only)",
+    },
+    'repeat': {
+        'kind': 'objective', 'enabled': True, 'weight': 20,
+        'description': "Penalty when a subject that isn't high priority has several lectures on a day",
+    },
+    'gaps': {
+        'kind': 'objective', 'enabled': True, 'weight': 100,
+        'description': "Penalty per lecture when a subject's lectures of a day are not back to back",
+    },
+    'preferred_days': {
+        'kind': 'objective', 'enabled': False, 'weight': 10,
+        'subjects': {},
+        'description': "Reward per lecture on one of the subject's preferred days ({subject: [day, ...]})",
+    },
+    'teacher_consecutive': {
+        'kind': 'objective', 'enabled': False, 'weight': 50,
+        'max': 3,
+        'description': "Penalty per lecture beyond `max` back-to-back lectures of one teacher, "
+                       "counting their lectures in other classes",
+    },
+    'max_per_day': {
+        'kind': 'constraint', 'enabled': True,
+        'limit': 2,
+        'description': "At most `limit` lectures of a subject per day (off: no limit)",
+    },
+    'credit_overrides': {
+        'kind': 'constraint', 'enabled': True,
+        'credits': {'ML & AI': 4},
+        'description': "Weekly lectures used instead of the stored credits ({subject: lectures})",
+    },
+    'no_afternoon': {
+        'kind': 'constraint', 'enabled': False,
+        'subjects': [], 'after': '13:00',
+        'description': "The listed subjects get no lecture starting at or after `after`",
+    },
+}
+
+
+def _check(name, key, value, default):
+    if key == 'enabled':
+        if not isinstance(value, bool):
+            raise ValueError(f"{name}.enabled must be true or false")
+    elif isinstance(default, int):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name}.{key} must be a whole number >= 0")
+    elif not isinstance(value, type(default)):
+        raise ValueError(f"{name}.{key} must be a {type(default).__name__}")
+    return copy.deepcopy(value)
+
+
+def resolve_rules(settings=None):
+    """
+    Merges rule settings ({rule: {'enabled': ..., 'weight': ..., param: ...}}, e.g. a
+    school's stored rules) over the RULES defaults. Settings may be partial, and an
+    already resolved dict resolves to itself.
+    Returns {rule: {'enabled', 'weight' (objectives), params...}}.
+    Raises ValueError for unknown rules / settings and invalid values.
+    """
+    resolved = {name: {key: copy.deepcopy(value) for key, value in rule.items() if key not in ('kind', 'description')}
+                for name, rule in RULES.items()}
+    if settings is None:
+        settings = {}
+    if not isinstance(settings, dict):
+        raise ValueError("Rules must be an object of {rule: settings}")
+
+    for name, values in settings.items():
+        if name not in RULES:
+            raise ValueError(f"Unknown rule '{name}'")
+        if not isinstance(values, dict):
+            raise ValueError(f"Settings of rule '{name}' must be an object")
+        for key, value in values.items():
+            if key not in resolved[name]:
+                raise ValueError(f"Unknown setting '{key}' for rule '{name}'")
+            resolved[name][key] = _check(name, key, value, resolved[name][key])
+
+    if resolved['max_per_day']['limit'] < 1:
+        raise ValueError("max_per_day.limit must be at least 1")
+    if resolved['teacher_consecutive']['max'] < 1:
+        raise ValueError("teacher_consecutive.max must be at least 1")
+    for subject, days in resolved['preferred_days']['subjects'].items():
+        if not isinstance(days, list) or any(day not in DAYS for day in days):
+            raise ValueError(f"preferred_days of {subject} must be a list of {', '.join(DAYS)}")
+    for subject, lectures in resolved['credit_overrides']['credits'].items():
+        if isinstance(lectures, bool) or not isinstance(lectures, int) or lectures < 0:
+            raise ValueError(f"credit_overrides of {subject} must be a whole number >= 0")
+    if not all(isinstance(subject, str) for subject in resolved['no_afternoon']['subjects']):
+        raise ValueError("no_afternoon.subjects must be a list of subject names")
+    try:
+        if _minutes(resolved['no_afternoon']['after']) is None:
+            raise ValueError
+    except (ValueError, IndexError):
+        raise ValueError("no_afternoon.after must be a time such as '13:00'")
+    return resolved
+
+
+def day_limit(rules, n_slots):
+    """Lectures of one subject allowed per day (n_slots when max_per_day is off)."""
+    rule = rules['max_per_day']
+    return rule['limit'] if rule['enabled'] else n_slots
+
+
+def effective_credits(credits, rules):
+    """{subject: weekly lectures} after credit_overrides."""
+    current_credits = credits.copy()
+    rule = rules['credit_overrides']
+    if rule['enabled']:
+        for subject, lectures in rule['credits'].items():
+            if subject in current_credits:
+                current_credits[subject] = lectures
+    return current_credits
+
+
+def blocked_slots(rules, timeslots, invalid_slots):
+    """
+    invalid_slots ({subject: set((day, time_str))}) plus the cells closed by the
+    constraint rules (no_afternoon). The caller's dict is not modified.
+    """
+    rule = rules['no_afternoon']
+    if not rule['enabled'] or not rule['subjects']:
+        return invalid_slots
+    after = _minutes(rule['after'])
+    late = [t for t in timeslots if _minutes(t) >= after]
+    blocked = {subject: set(cells) for subject, cells in invalid_slots.items()}
+    for subject in rule['subjects']:
+        blocked.setdefault(subject, set()).update((day, t) for day in DAYS for t in late)
+    return blocked
+
+
+def _run_excess(mask, longest):
+    # Lectures beyond `longest` in each run of consecutive bits
+    run = mask
+    for shift in range(1, longest + 1):
+        run &= mask >> shift
+    return popcount(run)
+
+
+class Objective:
+    """
+    The objective rules of one problem compiled into per-subject tables, so that
+    every evaluator (Objective.score, fitness.batch_scores, fitness.IncrementalScore)
+    works on ints, bitmasks and arrays only. Rules that are off cost nothing.
+
+    The score is a sum of one term per (day, subject) with lectures (see term) plus,
+    when teacher_consecutive is on, one term per (day, teacher) (see teacher_term).
+    teachers ({subject: teacher_id}) and teacher_busy ({teacher_id: set((day, time_str))},
+    lectures in other classes) are only needed for teacher_consecutive.
+    """
+
+    def __init__(self, encoding, rules, teachers=None, teacher_busy=None):
+        self.encoding = encoding
+        self.limit = day_limit(rules, encoding.n_slots)
+
+        def weight(name):
+            return rules[name]['weight'] if rules[name]['enabled'] else 0
+
+        priority = encoding.priority
+        high_priority = encoding.high_priority
+        subject_ids = range(encoding.n_subjects)
+        self.day_value = weight('variety') + weight('spread')
+        self.lecture_value = [weight('priority') * priority[sid] for sid in subject_ids]
+        self.pair_bonus = [weight('doubles') * priority[sid] if high_priority[sid] else 0 for sid in subject_ids]
+        self.repeat_penalty = [0 if high_priority[sid] else weight('repeat') for sid in subject_ids]
+        self.overload = weight('overload')
+        self.gap = weight('gaps')
+
+        # Per (subject, day) reward per lecture, None when no subject has preferred days
+        self.day_bonus = None
+        preferred = rules['preferred_days']['subjects'] if weight('preferred_days') else {}
+        if any(subject in encoding.subject_ids for subject in preferred):
+            self.day_bonus = [[0] * encoding.n_days for _ in subject_ids]
+            for subject, days in preferred.items():
+                sid = encoding.subject_ids.get(subject)
+                if sid is None:
+                    continue
+                for day in days:
+                    if day in encoding.day_ids:
+                        self.day_bonus[sid][encoding.day_ids[day]] = weight('preferred_days')
+
+        # Teachers of this problem, indexed 0..n_teachers-1
+        self.teacher_weight = weight('teacher_consecutive') if teachers else 0
+        self.teacher_max = rules['teacher_consecutive']['max']
+        self.teacher_of = [-1] * encoding.n_subjects
+        self.teacher_subjects = []
+        self.teacher_busy = []
+        self.teacher_base = []
+        if self.teacher_weight:
+            teacher_index = {}
+            for subject, teacher_id in teachers.items():
+                sid = encoding.subject_ids.get(subject)
+                if sid is None or teacher_id is None:
+                    continue
+                if teacher_id not in teacher_index:
+                    teacher_index[teacher_id] = len(self.teacher_subjects)
+                    self.teacher_subjects.append([])
+                    busy = [0] * encoding.n_days
+                    for day, t in (teacher_busy or {}).get(teacher_id, ()):
+                        if day in encoding.day_ids and t in encoding.slot_ids:
+                            busy[encoding.day_ids[day]] |= 1 << encoding.slot_ids[t]
+                    self.teacher_busy.append(busy)
+                    # Runs in other classes alone are not this timetable's doing
+                    self.teacher_base.append([_run_excess(mask, self.teacher_max) for mask in busy])
+                t_idx = teacher_index[teacher_id]
+                self.teacher_of[sid] = t_idx
+                self.teacher_subjects[t_idx].append(sid)
+
+    def term(self, day_idx, sid, mask):
+        """What subject sid contributes on a day where it holds the slots in mask."""
+        if not mask:
+            return 0
+        count = popcount(mask)
+        term = self.day_value + self.lecture_value[sid] * count
+        if count > self.limit:
+            term -= (count - self.limit) * self.overload
+        elif count >= 2:
+            term -= self.repeat_penalty[sid]
+        if count >= 2:
+            run = mask >> lowest_bit(mask)
+            if run & (run + 1):
+                # Not a single contiguous block of slots
+                term -= self.gap * count
+        if self.pair_bonus[sid]:
+            term += self.pair_bonus[sid] * popcount(mask & (mask >> 1))
+        if self.day_bonus is not None:
+            term += self.day_bonus[sid][day_idx] * count
+        return term
+
+    def teacher_term(self, day_idx, t_idx, mask):
+        """What teacher t_idx contributes on a day where they teach the slots in mask."""
+        return -self.teacher_weight * (_run_excess(mask, self.teacher_max) - self.teacher_base[t_idx][day_idx])
+
+    def teacher_mask(self, day_idx, t_idx, subject_masks):
+        # Slots the teacher teaches that day; subject_masks is indexable by subject id
+        mask = self.teacher_busy[t_idx][day_idx]
+        for sid in self.teacher_subjects[t_idx]:
+            mask |= subject_masks[sid]
+        return mask
+
+    def score(self, grid):
+        """Score of one encoded grid."""
+        encoding = self.encoding
+        n_slots = encoding.n_slots
+        score = 0
+        for day_idx in range(encoding.n_days):
+            masks = [0] * encoding.n_subjects
+            base = day_idx * n_slots
+            for k in range(n_slots):
+                sid = grid[base + k]
+                if sid != EMPTY:
+                    masks[sid] |= 1 << k
+            for sid, mask in enumerate(masks):
+                if mask:
+                    score += self.term(day_idx, sid, mask)
+            if self.teacher_weight:
+                for t_idx in range(len(self.teacher_subjects)):
+                    score += self.teacher_term(day_idx, t_idx, self.teacher_mask(day_idx, t_idx, masks))
+        return score
+
+    def tables(self):
+        """
+        The numpy lookup tables of batch_scores, built on first use. Subject tables
+        have a trailing 0 so EMPTY (-1) cells map to 0.
+        """
+        tables = getattr(self, '_tables', None)
+        if tables is None:
+            tables = {
+                'lecture_value': np.array(self.lecture_value + [0], dtype=np.int64),
+                'pair_bonus': np.array(self.pair_bonus + [0], dtype=np.int64),
+                'repeat_penalty': np.array(self.repeat_penalty, dtype=np.int64),
+                # (day x subject)
+                'day_bonus': np.array(self.day_bonus, dtype=np.int64).T if self.day_bonus is not None else None,
+                'teacher_of': np.array(self.teacher_of + [-1], dtype=np.int64),
+                # (teacher x day x slot)
+                'teacher_busy': np.array([[[(mask >> k) & 1 for k in range(self.encoding.n_slots)] for mask in busy]
+                                          for busy in self.teacher_busy], dtype=bool),
+                'teacher_base': [sum(base) for base in self.teacher_base],
+            }
+            self._tables = tables
+        return tables
@@ -1,11 +1,28 @@
 
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash
+import hashlib
+import json
+import logging
+from collections import Counter
+from flask import Blueprint, Response, render_template, request, jsonify, session, redirect, url_for, flash, send_file
 from datetime import datetime, timedelta
-from src.database.database import connect_db, fetch_data, get_timetable_by_class
-from src.logic.algorithms import genetic_algorithm
+from src.database.database import (db_connection, fetch_data, get_timetable_by_class, invalidate_occupancy,
+                                   pool_stats, school_occupancy)
+from src.database.timeslots import timeslot_registry
+from src.logic.algorithms import generate_schedule, new_seed, score_schedule
+from src.logic.encoding import DAYS
+from src.logic.config import Config
+from src.logic.day_schedule import day_schedule
+from src.logic.model import ProblemModel
+from src.logic.rules import RULES, resolve_rules
+from src.utils.cache import invalidate_school, school_id_cache, timetable_cache
+from src.utils.jobs import DONE, FAILED, CANCELLED, JobCancelled, get_job_queue
+from src.utils import metrics
+from src.utils.profiling import list_profiles, profile_call, profile_file
+from src.utils.results import get_result_store
 from functools import wraps
 
 main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
 def login_required(f):
     @wraps(f)
@@ -27,180 +44,183 @@ def dashboard():
 @main_bp.route('/manage_teachers', methods=['GET', 'POST'])
 @login_required
 def manage_teachers():
-    db = connect_db()
-    cursor = db.cursor(dictionary=True)
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
     
-    edit_teacher = None
+        edit_teacher = None
     
-    if request.method == 'POST':
-        action = request.form.get('action')
+        if request.method == 'POST':
+            action = request.form.get('action')
         
-        if action == 'delete':
-            teacher_id = request.form.get('teacher_id')
-            try:
-                # Cascade DELETE: 
-                # 1. Remove from timetable
-                cursor.execute("DELETE FROM timetable WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
-                # 2. Remove from allocated_timeslots (if applicable)
-                cursor.execute("DELETE FROM allocated_timeslots WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
-                # 3. Remove assigned subjects (Constraint causing the issue)
-                cursor.execute("DELETE FROM subject WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
-                # 4. Finally delete the teacher
-                cursor.execute("DELETE FROM teacher WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
+            if action == 'delete':
+                teacher_id = request.form.get('teacher_id')
+                try:
+                    # Cascade DELETE: 
+                    # 1. Remove from timetable
+                    cursor.execute("DELETE FROM timetable WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
+                    # 2. Remove from allocated_timeslots (if applicable)
+                    cursor.execute("DELETE FROM allocated_timeslots WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
+                    # 3. Remove assigned subjects (Constraint causing the issue)
+                    cursor.execute("DELETE FROM subject WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
+                    # 4. Finally delete the teacher
+                    cursor.execute("DELETE FROM teacher WHERE teacher_id = %s AND school_id = %s", (teacher_id, session['school_id']))
                 
-                db.commit()
-                flash('Teacher and their assigned subjects deleted successfully!', 'success')
-            except Exception as e:
-                flash(f'Error deleting teacher: {str(e)}', 'error')
+                    db.commit()
+                    invalidate_occupancy(session['school_id'])
+                    invalidate_school(session['school_id'])
+                    flash('Teacher and their assigned subjects deleted successfully!', 'success')
+                except Exception as e:
+                    flash(f'Error deleting teacher: {str(e)}', 'error')
                 
-        elif action == 'update':
-            teacher_id = request.form.get('teacher_id')
-            name = request.form.get('teacher_name')
-            try:
-                cursor.execute("UPDATE teacher SET teacher_name = %s WHERE teacher_id = %s AND school_id = %s", (name, teacher_id, session['school_id']))
-                db.commit()
-                flash('Teacher updated successfully!', 'success')
-                return redirect(url_for('main.manage_teachers'))
-            except Exception as e:
-                flash(f'Error updating teacher: {str(e)}', 'error')
-
-        else: # Add
-            try:
+            elif action == 'update':
+                teacher_id = request.form.get('teacher_id')
                 name = request.form.get('teacher_name')
-                if name:
-                    cursor.execute("INSERT INTO teacher (teacher_name, school_id) VALUES (%s, %s)", (name, session['school_id']))
+                try:
+                    cursor.execute("UPDATE teacher SET teacher_name = %s WHERE teacher_id = %s AND school_id = %s", (name, teacher_id, session['school_id']))
                     db.commit()
-                    flash('Teacher added successfully!', 'success')
-            except Exception as e:
-                flash(f'Error adding teacher: {str(e)}', 'error')
+                    flash('Teacher updated successfully!', 'success')
+                    return redirect(url_for('main.manage_teachers'))
+                except Exception as e:
+                    flash(f'Error updating teacher: {str(e)}', 'error')
 
-    # GET: Check for edit_id
-    edit_id = request.args.get('edit_id')
-    if edit_id:
-        cursor.execute("SELECT * FROM teacher WHERE teacher_id = %s AND school_id = %s", (edit_id, session['school_id']))
-        edit_teacher = cursor.fetchone()
+            else: # Add
+                try:
+                    name = request.form.get('teacher_name')
+                    if name:
+                        cursor.execute("INSERT INTO teacher (teacher_name, school_id) VALUES (%s, %s)", (name, session['school_id']))
+                        db.commit()
+                        flash('Teacher added successfully!', 'success')
+                except Exception as e:
+                    flash(f'Error adding teacher: {str(e)}', 'error')
+
+        # GET: Check for edit_id
+        edit_id = request.args.get('edit_id')
+        if edit_id:
+            cursor.execute("SELECT * FROM teacher WHERE teacher_id = %s AND school_id = %s", (edit_id, session['school_id']))
+            edit_teacher = cursor.fetchone()
             
-    cursor.execute("SELECT * FROM teacher WHERE school_id = %s", (session['school_id'],))
-    teachers = cursor.fetchall()
-    db.close()
+        cursor.execute("SELECT * FROM teacher WHERE school_id = %s", (session['school_id'],))
+        teachers = cursor.fetchall()
     return render_template('manage_teachers.html', teachers=teachers, edit_teacher=edit_teacher)
 
 @main_bp.route('/manage_subjects', methods=['GET', 'POST'])
 @login_required
 def manage_subjects():
-    db = connect_db()
-    cursor = db.cursor(dictionary=True)
-    school_id = session['school_id']
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        school_id = session['school_id']
 
-    # Ensure a default course exists (MVP shortcut)
-    cursor.execute("SELECT course_id FROM course WHERE school_id = %s LIMIT 1", (school_id,))
-    course = cursor.fetchone()
-    if not course:
-        cursor.execute("INSERT INTO course (course_name, school_id) VALUES ('Standard', %s)", (school_id,))
-        db.commit()
-        course_id = cursor.lastrowid
-    else:
-        course_id = course['course_id']
+        # Ensure a default course exists (MVP shortcut)
+        cursor.execute("SELECT course_id FROM course WHERE school_id = %s LIMIT 1", (school_id,))
+        course = cursor.fetchone()
+        if not course:
+            cursor.execute("INSERT INTO course (course_name, school_id) VALUES ('Standard', %s)", (school_id,))
+            db.commit()
+            course_id = cursor.lastrowid
+        else:
+            course_id = course['course_id']
         
-    edit_class = None
-    edit_subject = None
+        edit_class = None
+        edit_subject = None
 
-    if request.method == 'POST':
-        action = request.form.get('action')
-        try:
-            if action == 'add_class':
-                class_name = request.form.get('class_name')
-                if class_name:
-                    cursor.execute("INSERT INTO class (class_name, school_id) VALUES (%s, %s)", (class_name, school_id))
-                    db.commit()
-                    flash('Class added successfully!', 'success')
+        if request.method == 'POST':
+            action = request.form.get('action')
+            try:
+                if action == 'add_class':
+                    class_name = request.form.get('class_name')
+                    if class_name:
+                        cursor.execute("INSERT INTO class (class_name, school_id) VALUES (%s, %s)", (class_name, school_id))
+                        db.commit()
+                        flash('Class added successfully!', 'success')
             
-            elif action == 'update_class':
-                class_id = request.form.get('class_id')
-                class_name = request.form.get('class_name')
-                cursor.execute("UPDATE class SET class_name = %s WHERE class_id = %s AND school_id = %s", (class_name, class_id, school_id))
-                db.commit()
-                flash('Class updated successfully!', 'success')
-                return redirect(url_for('main.manage_subjects'))
-
-            elif action == 'delete_class':
-                class_id = request.form.get('class_id')
-                # Manual cascade delete for subjects
-                cursor.execute("DELETE FROM subject WHERE class_id = %s AND school_id = %s", (class_id, school_id))
-                cursor.execute("DELETE FROM class WHERE class_id = %s AND school_id = %s", (class_id, school_id))
-                db.commit()
-                flash('Class and its subjects deleted successfully!', 'success')
+                elif action == 'update_class':
+                    class_id = request.form.get('class_id')
+                    class_name = request.form.get('class_name')
+                    cursor.execute("UPDATE class SET class_name = %s WHERE class_id = %s AND school_id = %s", (class_name, class_id, school_id))
+                    db.commit()
+                    flash('Class updated successfully!', 'success')
+                    return redirect(url_for('main.manage_subjects'))
+
+                elif action == 'delete_class':
+                    class_id = request.form.get('class_id')
+                    # Manual cascade delete for subjects
+                    cursor.execute("DELETE FROM subject WHERE class_id = %s AND school_id = %s", (class_id, school_id))
+                    cursor.execute("DELETE FROM class WHERE class_id = %s AND school_id = %s", (class_id, school_id))
+                    db.commit()
+                    flash('Class and its subjects deleted successfully!', 'success')
             
-            elif action == 'add_subject':
-                subject_name = request.form.get('subject_name')
-                class_id = request.form.get('class_id')
-                teacher_id = request.form.get('teacher_id')
-                credits = request.form.get('credits') 
-                semester = request.form.get('semester')
+                elif action == 'add_subject':
+                    subject_name = request.form.get('subject_name')
+                    class_id = request.form.get('class_id')
+                    teacher_id = request.form.get('teacher_id')
+                    credits = request.form.get('credits') 
+                    semester = request.form.get('semester')
                 
-                cursor.execute("""
-                    INSERT INTO subject (subject_name, class_id, course_id, teacher_id, semester, credits, school_id)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (subject_name, class_id, course_id, teacher_id, semester, credits, school_id))
-                db.commit()
-                flash('Subject added successfully!', 'success')
-
-            elif action == 'update_subject':
-                subject_id = request.form.get('subject_id')
-                subject_name = request.form.get('subject_name')
-                class_id = request.form.get('class_id')
-                teacher_id = request.form.get('teacher_id')
-                credits = request.form.get('credits') 
-                semester = request.form.get('semester')
+                    cursor.execute("""
+                        INSERT INTO subject (subject_name, class_id, course_id, teacher_id, semester, credits, school_id)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, (subject_name, class_id, course_id, teacher_id, semester, credits, school_id))
+                    db.commit()
+                    flash('Subject added successfully!', 'success')
+
+                elif action == 'update_subject':
+                    subject_id = request.form.get('subject_id')
+                    subject_name = request.form.get('subject_name')
+                    class_id = request.form.get('class_id')
+                    teacher_id = request.form.get('teacher_id')
+                    credits = request.form.get('credits') 
+                    semester = request.form.get('semester')
                 
-                cursor.execute("""
-                    UPDATE subject 
-                    SET subject_name=%s, class_id=%s, teacher_id=%s, semester=%s, credits=%s
-                    WHERE subject_id=%s AND school_id=%s
-                """, (subject_name, class_id, teacher_id, semester, credits, subject_id, school_id))
-                db.commit()
-                flash('Subject updated successfully!', 'success')
-                return redirect(url_for('main.manage_subjects'))
+                    cursor.execute("""
+                        UPDATE subject 
+                        SET subject_name=%s, class_id=%s, teacher_id=%s, semester=%s, credits=%s
+                        WHERE subject_id=%s AND school_id=%s
+                    """, (subject_name, class_id, teacher_id, semester, credits, subject_id, school_id))
+                    db.commit()
+                    flash('Subject updated successfully!', 'success')
+                    return redirect(url_for('main.manage_subjects'))
 
-            elif action == 'delete_subject':
-                subject_id = request.form.get('subject_id')
-                cursor.execute("DELETE FROM subject WHERE subject_id = %s AND school_id = %s", (subject_id, school_id))
-                db.commit()
-                flash('Subject deleted successfully!', 'success')
+                elif action == 'delete_subject':
+                    subject_id = request.form.get('subject_id')
+                    cursor.execute("DELETE FROM subject WHERE subject_id = %s AND school_id = %s", (subject_id, school_id))
+                    db.commit()
+                    flash('Subject deleted successfully!', 'success')
 
-        except Exception as e:
-            flash(f'Error: {str(e)}', 'error')
-            pass
-
-    # Check for Edit Mode
-    edit_class_id = request.args.get('edit_class_id')
-    if edit_class_id:
-        cursor.execute("SELECT * FROM class WHERE class_id = %s AND school_id = %s", (edit_class_id, school_id))
-        edit_class = cursor.fetchone()
-
-    edit_subject_id = request.args.get('edit_subject_id')
-    if edit_subject_id:
-         cursor.execute("SELECT * FROM subject WHERE subject_id = %s AND school_id = %s", (edit_subject_id, school_id))
-         edit_subject = cursor.fetchone()
-
-    # Fetch Data
-    cursor.execute("SELECT * FROM class WHERE school_id = %s", (school_id,))
-    classes = cursor.fetchall()
-
-    cursor.execute("SELECT * FROM teacher WHERE school_id = %s", (school_id,))
-    teachers = cursor.fetchall()
+            except Exception as e:
+                flash(f'Error: {str(e)}', 'error')
+                pass
+            finally:
+                # Class and subject names appear in published timetables
+                invalidate_school(school_id)
+
+        # Check for Edit Mode
+        edit_class_id = request.args.get('edit_class_id')
+        if edit_class_id:
+            cursor.execute("SELECT * FROM class WHERE class_id = %s AND school_id = %s", (edit_class_id, school_id))
+            edit_class = cursor.fetchone()
+
+        edit_subject_id = request.args.get('edit_subject_id')
+        if edit_subject_id:
+             cursor.execute("SELECT * FROM subject WHERE subject_id = %s AND school_id = %s", (edit_subject_id, school_id))
+             edit_subject = cursor.fetchone()
+
+        # Fetch Data
+        cursor.execute("SELECT * FROM class WHERE school_id = %s", (school_id,))
+        classes = cursor.fetchall()
+
+        cursor.execute("SELECT * FROM teacher WHERE school_id = %s", (school_id,))
+        teachers = cursor.fetchall()
     
-    # Fetch subjects with joins
-    cursor.execute("""
-        SELECT s.*, c.class_name, t.teacher_name 
-        FROM subject s
-        JOIN class c ON s.class_id = c.class_id
-        JOIN teacher t ON s.teacher_id = t.teacher_id
-        WHERE s.school_id = %s
-    """, (school_id,))
-    subjects = cursor.fetchall()
-
-    db.close()
+        # Fetch subjects with joins
+        cursor.execute("""
+            SELECT s.*, c.class_name, t.teacher_name 
+            FROM subject s
+            JOIN class c ON s.class_id = c.class_id
+            JOIN teacher t ON s.teacher_id = t.teacher_id
+            WHERE s.school_id = %s
+        """, (school_id,))
+        subjects = cursor.fetchall()
+
     return render_template('manage_subjects.html', classes=classes, teachers=teachers, subjects=subjects, edit_class=edit_class, edit_subject=edit_subject)
 
 @main_bp.route('/manage_timings', methods=['GET', 'POST'])
@@ -239,34 +259,33 @@ def manage_timings():
         end_time = start_time + timedelta(minutes=total_minutes)
         end_time_str = end_time.strftime("%H:%M")
 
-        db = connect_db()
-        cursor = db.cursor()
-        
-        try:
-            sql = """
-                UPDATE schools 
-                SET start_time = %s, end_time = %s, lecture_duration = %s, break_start_time = %s, break_duration = %s
-                WHERE school_id = %s
-            """
-            cursor.execute(sql, (start_time_str, end_time_str, lecture_duration, break_start_str, break_duration, session['school_id']))
-            db.commit()
-            
-            # Update session config
-            session['time_config'] = {
-                'start_time': start_time_str,
-                'end_time': end_time_str,
-                'lecture_duration': lecture_duration,
-                'break_start': break_start_str,
-                'break_duration': break_duration,
-                'num_lectures': num_lectures,
-                'break_after': break_after
-            }
-            flash('Timings updated successfully!', 'success')
-        except Exception as e:
-            flash(f'Error updating timings: {str(e)}', 'error')
-        finally:
-            db.close()
+        with db_connection() as db:
+            cursor = db.cursor()
+
+            try:
+                sql = """
+                    UPDATE schools 
+                    SET start_time = %s, end_time = %s, lecture_duration = %s, break_start_time = %s, break_duration = %s
+                    WHERE school_id = %s
+                """
+                cursor.execute(sql, (start_time_str, end_time_str, lecture_duration, break_start_str, break_duration, session['school_id']))
+                db.commit()
+                invalidate_school(session['school_id'])
             
+                # Update session config
+                session['time_config'] = {
+                    'start_time': start_time_str,
+                    'end_time': end_time_str,
+                    'lecture_duration': lecture_duration,
+                    'break_start': break_start_str,
+                    'break_duration': break_duration,
+                    'num_lectures': num_lectures,
+                    'break_after': break_after
+                }
+                flash('Timings updated successfully!', 'success')
+            except Exception as e:
+                flash(f'Error updating timings: {str(e)}', 'error')
+
         return redirect(url_for('main.manage_timings'))
 
     # GET request
@@ -329,255 +348,557 @@ def save_priorities():
 @main_bp.route('/generate_setup')
 @login_required
 def generate_setup():
-    db = connect_db()
-    cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM class WHERE school_id = %s", (session['school_id'],))
-    classes = cursor.fetchall()
-    db.close()
-    return render_template('generate.html', classes=classes)
-
-def get_daily_slots(config, include_break=False):
-    start_str = config.get('start_time')
-    end_str = config.get('end_time')
-    duration_min = int(config.get('lecture_duration', 60))
-    break_start_str = config.get('break_start')
-    break_duration_min = int(config.get('break_duration', 0))
-
-    start_time = datetime.strptime(start_str, "%H:%M")
-    end_time = datetime.strptime(end_str, "%H:%M")
-    
-    break_start = None
-    break_end = None
-    if break_start_str:
-        break_start = datetime.strptime(break_start_str, "%H:%M")
-        break_end = break_start + timedelta(minutes=break_duration_min)
-
-    slots = []
-    current = start_time
-    
-    while current + timedelta(minutes=duration_min) <= end_time:
-        slot_end = current + timedelta(minutes=duration_min)
-        
-        # Check if this slot overlaps with break
-        if break_start and break_end:
-            # Simplified: If current equals break start, it's a break slot.
-            if current >= break_start and current < break_end:
-                 if include_break:
-                     slots.append({'time': current.strftime("%H:%M:%S"), 'type': 'break'})
-                 current = break_end # Skip past break
-                 continue
-            
-            # Also handle if slot end > break start (overlap from left)
-            if current < break_start and slot_end > break_start:
-                 current = break_end
-                 continue
-
-        if include_break:
-             slots.append({'time': current.strftime("%H:%M:%S"), 'type': 'lecture'})
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM class WHERE school_id = %s", (session['school_id'],))
+        classes = cursor.fetchall()
+    # Background jobs are only polled from other workers when the job store is shared
+    return render_template('generate.html', classes=classes, async_jobs=get_job_queue().store.shared)
+
+def _build_teacher_busy_map(db, cursor, school_id, teacher_ids, exclude_class_ids=(), exclude_subject_ids=()):
+    # Map: teacher_id -> set of (day, time_string), only for the teachers being scheduled
+    occupancy = school_occupancy(cursor, school_id)
+    lectures = [(t_id, day, time_id)
+                for t_id in teacher_ids
+                for day, time_id, class_id, subject_id in occupancy.get(t_id, ())
+                if class_id not in exclude_class_ids and subject_id not in exclude_subject_ids]
+    id_to_time_map = timeslot_registry.id_to_time(db, {time_id for _, _, time_id in lectures})
+
+    teacher_busy_map = {}
+    for t_id, day, time_id in lectures:
+        # Convert time_id to string
+        t_str = id_to_time_map.get(time_id)
+        if t_str and day:
+            teacher_busy_map.setdefault(t_id, set()).add((day, t_str))
+    return teacher_busy_map
+
+
+def _build_invalid_slots(subject_rows, teacher_busy_map, break_slots):
+    invalid_slots = {}
+    for row in subject_rows:
+        subj_name = row['subject_name']
+
+        if subj_name not in invalid_slots:
+            invalid_slots[subj_name] = set()
+
+        # 1. Add teacher busy slots
+        t_id = row['teacher_id']
+        if t_id in teacher_busy_map:
+            # We use update() to add all elements from the set
+            invalid_slots[subj_name].update(teacher_busy_map[t_id])
+
+        # 2. 🔹 Add break slots for ALL days to prevent allocation
+        for day in DAYS:
+            for b_slot in break_slots:
+                invalid_slots[subj_name].add((day, b_slot))
+    return invalid_slots
+
+
+def _replace_timetables(db, cursor, school_id, class_ids, insert_rows, run_rows=(), subject_ids=None):
+    """
+    Atomically swaps the stored timetable rows of class_ids for insert_rows:
+    one DELETE, one multi-row INSERT and one commit (rolled back on failure).
+    insert_rows are (teacher_id, subject_id, class_id, course_id, time_id, day, school_id) tuples.
+    run_rows record how each timetable was generated, see _run_row.
+    subject_ids, if given, limits the swap to those subjects' rows (class_ids is then
+    ignored) and to the generation_run rows of the (class, semester) pairs in run_rows.
+    """
+    try:
+        if subject_ids is None:
+            placeholders = ", ".join(["%s"] * len(class_ids))
+            cursor.execute(f"DELETE FROM timetable WHERE school_id = %s AND class_id IN ({placeholders})",
+                           (school_id, *class_ids))
+            cursor.execute(f"DELETE FROM generation_run WHERE school_id = %s AND class_id IN ({placeholders})",
+                           (school_id, *class_ids))
         else:
-             slots.append(current.strftime("%H:%M:%S"))
-             
-        current = slot_end
-        
-    return slots
+            placeholders = ", ".join(["%s"] * len(subject_ids))
+            cursor.execute(f"DELETE FROM timetable WHERE school_id = %s AND subject_id IN ({placeholders})",
+                           (school_id, *subject_ids))
+            cursor.executemany("DELETE FROM generation_run WHERE school_id = %s AND class_id = %s AND semester = %s",
+                               [(row[0], row[1], row[2]) for row in run_rows])
+        if insert_rows:
+            cursor.executemany(
+                "INSERT INTO timetable (teacher_id, subject_id, class_id, course_id, time_id, day, school_id) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                insert_rows
+            )
+        if run_rows:
+            cursor.executemany(
+                "INSERT INTO generation_run (school_id, class_id, semester, seed, score, params) VALUES (%s, %s, %s, %s, %s, %s)",
+                run_rows
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        invalidate_occupancy(school_id)
+        invalidate_school(school_id)
 
-def perform_timetable_generation(class_name, semester, priorities, school_id):
+
+def _engine_options():
+    options = dict(engine=Config.GENERATION_ENGINE, workers=Config.GENERATION_WORKERS, polish_ms=Config.LOCAL_SEARCH_MS)
+    if Config.GENERATION_ENGINE == "backtracking":
+        options.update(node_limit=Config.BACKTRACK_NODE_LIMIT, time_limit_ms=Config.BACKTRACK_TIME_MS)
+    return options
+
+
+def _school_rules(cursor, school_id):
+    # The school's rule settings (schools.rules JSON) merged over the defaults, see rules.RULES
+    cursor.execute("SELECT rules FROM schools WHERE school_id = %s", (school_id,))
+    row = cursor.fetchone()
+    return resolve_rules(json.loads(row['rules']) if row and row['rules'] else None)
+
+
+def _run_row(school_id, class_id, semester, seed, score, final_priorities, rules):
+    # Everything besides the database state needed to replay a generation
+    params = dict(_engine_options(), priorities=final_priorities, rules=rules)
+    return (school_id, class_id, int(semester), seed, score, json.dumps(params))
+
+
+def perform_timetable_generation(class_name, semester, priorities, school_id, time_config=None, progress=None,
+                                 seed=None):
     """
     Helper function to perform the actual timetable generation logic.
+    time_config defaults to the logged-in school's session config.
+    progress is forwarded to the generation engine (used by background jobs).
+    seed makes the run reproducible; a fresh one is drawn when not given. Either
+    way it is stored in generation_run next to the timetable.
     Returns: (saved_timetable, error_message)
     """
+    if seed is None:
+        seed = new_seed()
     try:
-        # Fetch subjects and their Credits from DB
-        db = connect_db()
-        cursor = db.cursor(dictionary=True, buffered=True)
+        # Fetch subjects and their Credits from DB. The connection goes back to the pool before
+        # the search, so long generations don't hold it while other requests wait for one.
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True, buffered=True)
         
-        # Get class_id
-        cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
-        res = cursor.fetchone()
-        if not res:
-            db.close()
-            return None, f"Class '{class_name}' not found"
-        class_id = res['class_id']
-
-        # Get course_id
-        cursor.execute("SELECT course_id FROM course WHERE school_id = %s LIMIT 1", (school_id,))
-        course_res = cursor.fetchone()
-        course_id = course_res['course_id'] if course_res else 1
-
-        # 🔹 Generate timetable with constraints
-        # 1. Map Subject -> Teacher -> Busy Slots
-        # We need to know which slots are invalid for each subject based on its teacher
-        invalid_slots = {} 
-        
-        # Build map of time_id -> time_string for easy lookup
-        # We need this to convert DB time_ids back to strings the algo understands
-        # We can build it from timeslots list assuming they map to IDs we just synced?
-        # Better: Query DB for all timeslots to get ID->String map
-        cursor.execute("SELECT time_id, timeslot FROM timeslot")
-        all_db_slots = cursor.fetchall() # list of (id, timedelta)
-        
-        id_to_time_map = {}
-        for row in all_db_slots:
-            # Format timedelta to HH:MM:SS
-            t_str = str(row['timeslot'])
-            if len(t_str) == 7: # 9:00:00 -> 09:00:00
-                 t_str = "0" + t_str
-            id_to_time_map[row['time_id']] = t_str
-
-        # Re-fetch subjects including teacher_id
-        cursor.execute("SELECT subject_name, credits, teacher_id FROM subject WHERE class_id = %s AND semester = %s AND school_id = %s", (class_id, semester, school_id))
-        subject_rows = cursor.fetchall()
-        
-        subjects = [row['subject_name'] for row in subject_rows]
-        credits = {row['subject_name']: row['credits'] for row in subject_rows}
-        # Re-map priorities
-        final_priorities = {}
-        for sub in subjects:
-            final_priorities[sub] = int(priorities.get(sub, 1))
-
-        # 🔹 Retrieve Time Config and Generate Timeslots
-        time_config = session.get('time_config')
-        if not time_config:
-             db.close()
-             return None, "Time configuration not found. Please re-login."
-
-        # Generate dynamic timeslots including breaks
-        all_slots_with_metadata = get_daily_slots(time_config, include_break=True)
-        # Use simple list of timeslot strings for the algorithm
-        timeslots = [s['time'] for s in all_slots_with_metadata]
-        break_slots = [s['time'] for s in all_slots_with_metadata if s['type'] == 'break']
+            with metrics.timer('load_subjects'):
+                # Get class_id
+                cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
+                res = cursor.fetchone()
+                if not res:
+                    return None, f"Class '{class_name}' not found"
+                class_id = res['class_id']
+
+                # Get course_id
+                cursor.execute("SELECT course_id FROM course WHERE school_id = %s LIMIT 1", (school_id,))
+                course_res = cursor.fetchone()
+                course_id = course_res['course_id'] if course_res else 1
+
+                # Re-fetch subjects including teacher_id
+                cursor.execute("SELECT subject_id, subject_name, credits, teacher_id FROM subject WHERE class_id = %s AND semester = %s AND school_id = %s", (class_id, semester, school_id))
+                subject_rows = cursor.fetchall()
         
-        # 🔹 Sync Timeslots to DB (Ensure they exist and get IDs)
-        # We prefer using the dynamic slots generated from config.
-        # But we need their IDs.
-        timeslot_id_map = {} # Map string -> ID
+            subjects = [row['subject_name'] for row in subject_rows]
+            credits = {row['subject_name']: row['credits'] for row in subject_rows}
+            # Re-map priorities
+            final_priorities = {}
+            for sub in subjects:
+                final_priorities[sub] = int(priorities.get(sub, 1))
+
+            # 🔹 Retrieve Time Config and Generate Timeslots
+            if time_config is None:
+                time_config = session.get('time_config')
+            if not time_config:
+                 return None, "Time configuration not found. Please re-login."
+
+            # Day layout (cached per time configuration); the algorithm gets every slot, breaks included
+            day_layout = day_schedule(time_config)
+            timeslots = list(day_layout.timeslots)
+            break_slots = list(day_layout.break_slots)
         
-        for slot in timeslots:
-            # Check if this exact string exists in DB map we built earlier
-             # We built id_to_time_map earlier: ID -> String
-             # Let's verify against that or just query/insert.
-             
-             # Reverse lookup in existing map?
-             found_id = None
-             for tid, tstr in id_to_time_map.items():
-                 if tstr == slot:
-                     found_id = tid
-                     break
-            
-             if found_id:
-                 timeslot_id_map[slot] = found_id
-             else:
-                 # Insert new if not found (Consistency check)
-                 cursor.execute("INSERT INTO timeslot (timeslot, type_of_class) VALUES (%s, 'lecture')", (slot,))
-                 timeslot_id_map[slot] = cursor.lastrowid
-                 # Update reverse map too just in case
-                 id_to_time_map[cursor.lastrowid] = slot
-        
-        db.commit() # Commit any new slots
-
-        # 🔹 Clear existing timetable for this class to prevent self-conflict
-        cursor.execute("DELETE FROM timetable WHERE class_id = %s", (class_id,))
-        db.commit()
-
-        # 🔹 RE-BUILD teacher_schedule_map with DAYS
-        cursor.execute("SELECT teacher_id, time_id, day FROM timetable")
-        existing_schedule_rows = cursor.fetchall()
-        
-        # Map: teacher_id -> set of (day, time_string)
-        teacher_busy_map = {}
-        for r_tid, r_timeid, r_day in existing_schedule_rows:
-            if r_tid not in teacher_busy_map:
-                teacher_busy_map[r_tid] = set()
-            
-            # Convert time_id to string
-            t_str = id_to_time_map.get(r_timeid)
-            if t_str and r_day:
-                teacher_busy_map[r_tid].add((r_day, t_str))
+            with metrics.timer('timeslots'):
+                timeslot_id_map = timeslot_registry.ids_for(db, timeslots)
+
+            # 🔹 RE-BUILD teacher_schedule_map with DAYS
+            # The class's own (about to be replaced) lectures must not block its teachers
+            teacher_ids = {row['teacher_id'] for row in subject_rows}
+            with metrics.timer('busy_map'):
+                teacher_busy_map = _build_teacher_busy_map(db, cursor, school_id, teacher_ids,
+                                                           exclude_class_ids={class_id})
+
+                # Now populate invalid_slots for our algorithm
+                invalid_slots = _build_invalid_slots(subject_rows, teacher_busy_map, break_slots)
+
+            rules = _school_rules(cursor, school_id)
+            cursor.close()
+
+        # The full invalid_slots dump is costly, only build it when debug logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Derived invalid_slots for constraints: %s", invalid_slots)
+        logger.info("Starting generation: class=%s sem=%s school=%s seed=%s", class_name, semester, school_id, seed)
+
+        # 🔹 Fail fast (in milliseconds) when the constraints leave no valid timetable
+        # The compiled model (with the school's rules) is kept for the engine, so the problem is only built once
+        with metrics.timer('feasibility'):
+            model = ProblemModel(subjects, timeslots, final_priorities, credits, invalid_slots, rules,
+                                 teachers={row['subject_name']: row['teacher_id'] for row in subject_rows},
+                                 teacher_busy=teacher_busy_map)
+            report = model.report()
+        if not report['feasible']:
+            logger.info("Infeasible: %s", report['problems'])
+            messages = "; ".join(p['message'] for p in report['problems'])
+            return None, f"Timetable for {class_name} (Sem {semester}) cannot be generated: {messages}"
 
-        # Now populate invalid_slots for our algorithm
-        days_list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
-        for row in subject_rows:
-            subj_name = row['subject_name']
-            
-            if subj_name not in invalid_slots:
-                invalid_slots[subj_name] = set()
-
-            # 1. Add teacher busy slots
-            t_id = row['teacher_id']
-            if t_id in teacher_busy_map:
-                # We use update() to add all elements from the set
-                invalid_slots[subj_name].update(teacher_busy_map[t_id])
-
-            # 2. 🔹 NEW: Add break slots for ALL days to prevent allocation
-            for day in days_list:
-                for b_slot in break_slots:
-                    invalid_slots[subj_name].add((day, b_slot))
-
-        # DEBUG LOGGING SETUP
-        import logging
-        logging.basicConfig(filename='debug_gen.log', level=logging.DEBUG)
-        
-        logging.info(f"DEBUG: derived invalid_slots for constraints: {invalid_slots}")
-
-        logging.info(f"STARTING GENERATION: Class={class_name}, Sem={semester}, School={school_id}")
-        
         # 🔹 Generate timetable
-        timetable = genetic_algorithm(subjects, timeslots, final_priorities, credits, invalid_slots=invalid_slots)
-        logging.info(f"Algorithm produced {len(timetable)} entries")
+        with metrics.timer('engine'):
+            timetable = generate_schedule(subjects, timeslots, final_priorities, credits, invalid_slots=invalid_slots,
+                                          seed=seed, progress=progress, model=model, **_engine_options())
+        logger.info("Algorithm produced %d entries", len(timetable))
+        if not timetable:
+            # Feasible on paper but the search found nothing: keep the stored timetable
+            return None, (f"No timetable was found for {class_name} (Sem {semester}) within the search budget; "
+                          "the current timetable was kept. Try again or relax the constraints.")
 
         # 🔹 Convert `timedelta` timeslot values to strings before querying
         for entry in timetable:
             if isinstance(entry["timeslot"], timedelta):  
                 entry["timeslot"] = str(entry["timeslot"])  
 
-        saved_timetable = [] 
-        logging.info(f"DEBUG: Starting DB insertion loop. Total generated entries: {len(timetable)}")
-
+        # 🔹 Replace the class's rows in one transaction
+        subject_ids = {row['subject_name']: (row['subject_id'], row['teacher_id']) for row in subject_rows}
+        saved_timetable = []
+        insert_rows = []
         for entry in timetable:
-            # Ensure semester is int for DB query consistency if column is int
-            semester_int = int(semester)
-            cursor.execute(
-                "SELECT subject_id, teacher_id FROM subject WHERE subject_name = %s AND class_id = %s AND semester = %s",
-                (entry["subject"], class_id, semester_int)
-            )
-            result = cursor.fetchone()
-            if result:
-                subject_id = result['subject_id']
-                teacher_id = result['teacher_id']
-                
-                time_id = timeslot_id_map.get(entry["timeslot"])
-                
-                if not time_id:
-                     # Fallback query
-                    cursor.execute("SELECT time_id FROM timeslot WHERE timeslot = %s", (entry["timeslot"],))
-                    time_id_result = cursor.fetchone()
-                    if time_id_result:
-                         time_id = int(time_id_result[0])
-                
-                if not time_id:
-                    logging.warning(f"DEBUG: Skipping entry {entry['subject']}: No time_id found for {entry['timeslot']}")
-                    continue 
-                
-                # Check for existing entry to prevent duplicates (though we deleted valid ones earlier)
-                # But we deleted WHERE class_id = ... so we should be clear.
-                
-                # Insert into timetable
+            time_id = timeslot_id_map.get(entry["timeslot"])
+            if not time_id:
+                logger.warning("Skipping entry %s: no time_id found for %s", entry['subject'], entry['timeslot'])
+                continue
+            subject_id, teacher_id = subject_ids[entry["subject"]]
+            insert_rows.append((teacher_id, subject_id, class_id, course_id, time_id, entry['day'], school_id))
+            saved_timetable.append(entry)
+
+        score = model.score(timetable)
+        run_row = _run_row(school_id, class_id, semester, seed, score, final_priorities, model.rules)
+        with db_connection() as db:
+            cursor = db.cursor()
+            try:
+                with metrics.timer('save'):
+                    _replace_timetables(db, cursor, school_id, [class_id], insert_rows, [run_row])
+            finally:
+                cursor.close()
+        return saved_timetable, None
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return None, str(e)
+
+
+def perform_school_generation(school_id, semester=None, priorities=None, time_config=None, rounds=1, progress=None,
+                              seed=None):
+    """
+    Generates the timetables of every class (and semester) of a school in one job.
+    Subjects, teachers and existing lectures are loaded once; classes are solved most
+    constrained first, then each is re-solved `rounds` more times against the others'
+    final slots so early classes don't keep the best slots just by going first.
+    Everything is written in a single transaction.
+    priorities: {class_name: {subject: priority}}
+    progress is called as progress(generation, best_score, step=..., class_name=...).
+    Search step k is seeded with seed + k; the seed of each kept timetable is stored
+    in generation_run.
+    Returns: ({class_name: {semester: saved_timetable}}, error_message)
+    """
+    priorities = priorities or {}
+    if seed is None:
+        seed = new_seed()
+    try:
+        if time_config is None:
+            time_config = session.get('time_config')
+        if not time_config:
+            return None, "Time configuration not found. Please re-login."
+
+        # Day layout (cached per time configuration), breaks included
+        day_layout = day_schedule(time_config)
+        timeslots = list(day_layout.timeslots)
+        break_slots = list(day_layout.break_slots)
+
+        # Everything the search needs is loaded up front; the connection goes back to the
+        # pool for the searches (every class x round) and a fresh one does the final write
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True, buffered=True)
+
+            cursor.execute("SELECT course_id FROM course WHERE school_id = %s LIMIT 1", (school_id,))
+            course_res = cursor.fetchone()
+            course_id = course_res['course_id'] if course_res else 1
+
+            query = """
+                SELECT s.subject_id, s.subject_name, s.credits, s.teacher_id, s.semester, c.class_id, c.class_name
+                FROM subject s
+                JOIN class c ON s.class_id = c.class_id
+                WHERE s.school_id = %s
+            """
+            params = [school_id]
+            if semester:
+                query += " AND s.semester = %s"
+                params.append(int(semester))
+            cursor.execute(query, tuple(params))
+            subject_rows = cursor.fetchall()
+            if not subject_rows:
+                return None, "No subjects found for this school."
+
+            # (class_id, semester) -> subject rows
+            groups = {}
+            for row in subject_rows:
+                groups.setdefault((row['class_id'], row['semester']), []).append(row)
+            class_ids = sorted({class_id for class_id, _ in groups})
+
+            timeslot_id_map = timeslot_registry.ids_for(db, timeslots)
+            rules = _school_rules(cursor, school_id)
+
+            # Lectures of classes outside this job still block their teachers
+            teacher_ids = {row['teacher_id'] for row in subject_rows}
+            base_busy_map = _build_teacher_busy_map(db, cursor, school_id, teacher_ids,
+                                                    exclude_class_ids=set(class_ids))
+
+            # Stored lectures of these classes per (class_id, semester): a group that ends up
+            # without a new timetable keeps them, so they block its teachers until it is solved.
+            # Semesters outside this job are never replaced and always block.
+            placeholders = ", ".join(["%s"] * len(class_ids))
+            cursor.execute(f"""
+                SELECT t.class_id, s.semester, t.teacher_id, t.day, t.time_id
+                FROM timetable t
+                JOIN subject s ON t.subject_id = s.subject_id
+                WHERE t.school_id = %s AND t.class_id IN ({placeholders})
+            """, (school_id, *class_ids))
+            stored_rows = cursor.fetchall()
+            id_to_time_map = timeslot_registry.id_to_time(db, {row['time_id'] for row in stored_rows})
+            stored_busy = {} # group -> set of (teacher_id, day, time_str)
+            for row in stored_rows:
+                t_str = id_to_time_map.get(row['time_id'])
+                if t_str and row['day']:
+                    stored_busy.setdefault((row['class_id'], row['semester']), set()).add((row['teacher_id'], row['day'], t_str))
+            for group, lectures in stored_busy.items():
+                if group not in groups:
+                    for t_id, day, t_str in lectures:
+                        base_busy_map.setdefault(t_id, set()).add((day, t_str))
+
+            cursor.close()
+
+        # Most constrained first: classes whose teachers carry the heaviest weekly load
+        teacher_load = {}
+        for row in subject_rows:
+            teacher_load[row['teacher_id']] = teacher_load.get(row['teacher_id'], 0) + row['credits']
+        order = sorted(groups, key=lambda g: (-max(teacher_load[r['teacher_id']] for r in groups[g]),
+                                              -sum(r['credits'] for r in groups[g]), g))
+
+        solutions = {} # group -> (score, schedule, step)
+        group_priorities = {}
+
+        def busy_map_without(group):
+            busy = {t_id: set(slots) for t_id, slots in base_busy_map.items()}
+            for other, (_, schedule, _) in solutions.items():
+                if other == group:
+                    continue
+                teacher_of = {r['subject_name']: r['teacher_id'] for r in groups[other]}
+                for entry in schedule:
+                    busy.setdefault(teacher_of[entry['subject']], set()).add((entry['day'], entry['timeslot']))
+            for other in groups:
+                if other != group and other not in solutions:
+                    for t_id, day, t_str in stored_busy.get(other, ()):
+                        busy.setdefault(t_id, set()).add((day, t_str))
+            return busy
+
+        def solve(group, step):
+            rows = groups[group]
+            class_priorities = priorities.get(rows[0]['class_name'], {})
+            subjects = [r['subject_name'] for r in rows]
+            credits = {r['subject_name']: r['credits'] for r in rows}
+            final_priorities = {sub: int(class_priorities.get(sub, 1)) for sub in subjects}
+            busy = busy_map_without(group)
+            invalid_slots = _build_invalid_slots(rows, busy, break_slots)
+            model = ProblemModel(subjects, timeslots, final_priorities, credits, invalid_slots, rules,
+                                 teachers={r['subject_name']: r['teacher_id'] for r in rows}, teacher_busy=busy)
+            class_progress = None
+            if progress is not None:
+                def class_progress(generation, best_score):
+                    progress(generation, best_score, step=step, steps=total_steps, class_name=rows[0]['class_name'])
+            schedule = generate_schedule(subjects, timeslots, final_priorities, credits, invalid_slots=invalid_slots,
+                                         seed=seed + step, progress=class_progress, model=model, **_engine_options())
+            if not schedule:
+                return None
+            group_priorities[group] = final_priorities
+            return model.score(schedule), schedule, step
+
+        total_steps = (1 + rounds) * len(order)
+        step = 0
+        for _ in range(1 + rounds):
+            for group in order:
+                step += 1
+                candidate = solve(group, step)
+                if candidate and (group not in solutions or candidate[0] > solutions[group][0]):
+                    solutions[group] = candidate
+
+        # 🔹 Replace the rows of every solved group in one transaction; unsolved groups keep theirs
+        insert_rows = []
+        run_rows = []
+        solved_subject_ids = []
+        results = {}
+        for group in order:
+            class_id, sem = group
+            rows = groups[group]
+            score, schedule, step = solutions.get(group, (None, [], None))
+            if schedule:
+                run_rows.append(_run_row(school_id, class_id, sem, seed + step, score, group_priorities[group],
+                                         rules))
+                solved_subject_ids.extend(r['subject_id'] for r in rows)
+            subject_ids = {r['subject_name']: (r['subject_id'], r['teacher_id']) for r in rows}
+            for entry in schedule:
+                subject_id, teacher_id = subject_ids[entry['subject']]
+                insert_rows.append((teacher_id, subject_id, class_id, course_id,
+                                    timeslot_id_map[entry['timeslot']], entry['day'], school_id))
+            results.setdefault(rows[0]['class_name'], {})[str(sem)] = schedule
+
+        if solved_subject_ids:
+            with db_connection() as db:
+                cursor = db.cursor()
                 try:
-                    cursor.execute(
+                    _replace_timetables(db, cursor, school_id, class_ids, insert_rows, run_rows,
+                                        subject_ids=solved_subject_ids)
+                finally:
+                    cursor.close()
+
+        return results, None
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return None, str(e)
+
+
+def _diff_timetable_rows(stored_rows, wanted):
+    """
+    Matches a class's stored rows against the wanted (subject_id, day, time_id) lectures.
+    stored_rows are dicts with timetable_id, subject_id, day and time_id.
+    Returns (deletes, inserts): the timetable_ids of rows no longer wanted and the
+    (subject_id, day, time_id) lectures to add. Unchanged lectures produce no writes.
+    A moved lecture is a delete plus an insert rather than an UPDATE, so the new
+    row id changes the occupancy fingerprint other workers check (see school_occupancy).
+    """
+    missing = Counter(wanted)
+    deletes = []
+    for row in stored_rows:
+        key = (row['subject_id'], row['day'], row['time_id'])
+        if missing[key] > 0:
+            missing[key] -= 1
+        else:
+            deletes.append(row['timetable_id'])
+    return deletes, list(missing.elements())
+
+
+def persist_modified_timetable(class_name, semester, school_id, timetable, time_config=None):
+    """
+    Saves a manually edited class timetable (list of {"day", "timeslot", "subject"})
+    to the timetable table. Only the lectures that changed are written (see
+    _diff_timetable_rows), in one transaction.
+    Rejected without writing anything when a subject doesn't belong to the class,
+    a lecture is outside the school's lecture slots, two lectures share a slot, or
+    a teacher already teaches another lecture then (other classes, or this class in
+    another semester). Only this semester's rows of the class are replaced.
+    Returns: (saved_timetable, error_message)
+    """
+    try:
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True, buffered=True)
+
+            cursor.execute("SELECT class_id FROM class WHERE class_name = %s AND school_id = %s", (class_name, school_id))
+            res = cursor.fetchone()
+            if not res:
+                return None, f"Class '{class_name}' not found"
+            class_id = res['class_id']
+
+            cursor.execute("SELECT course_id FROM course WHERE school_id = %s LIMIT 1", (school_id,))
+            course_res = cursor.fetchone()
+            course_id = course_res['course_id'] if course_res else 1
+
+            cursor.execute("SELECT subject_id, subject_name, teacher_id FROM subject WHERE class_id = %s AND semester = %s AND school_id = %s", (class_id, semester, school_id))
+            subject_ids = {row['subject_name']: (row['subject_id'], row['teacher_id']) for row in cursor.fetchall()}
+            if not subject_ids:
+                return None, f"{class_name} has no subjects in semester {semester}"
+
+            unknown = sorted({entry['subject'] for entry in timetable if entry['subject'] not in subject_ids})
+            if unknown:
+                return None, f"{', '.join(unknown)} not taught to {class_name} (Sem {semester})"
+
+            # 🔹 Every lecture must sit on a day and lecture slot of the school's layout
+            if time_config is None:
+                time_config = session.get('time_config')
+            if time_config:
+                lecture_slots = set(day_schedule(time_config).lecture_slots)
+                outside = [f"{entry['subject']} on {entry['day']} at {entry['timeslot']}" for entry in timetable
+                           if entry['day'] not in DAYS or entry['timeslot'] not in lecture_slots]
+                if outside:
+                    return None, f"Not a lecture slot of the school day: {'; '.join(outside)}"
+
+            cells = set()
+            for entry in timetable:
+                cell = (entry['day'], entry['timeslot'])
+                if cell in cells:
+                    return None, f"Two lectures are placed on {entry['day']} at {entry['timeslot']}"
+                cells.add(cell)
+
+            # 🔹 Teacher conflicts with every other lecture of the school, the class's other semesters included
+            teacher_busy_map = _build_teacher_busy_map(db, cursor, school_id,
+                                                       {teacher_id for _, teacher_id in subject_ids.values()},
+                                                       exclude_subject_ids={subject_id for subject_id, _ in subject_ids.values()})
+            conflicts = [f"{entry['subject']} on {entry['day']} at {entry['timeslot']}" for entry in timetable
+                         if (entry['day'], entry['timeslot']) in teacher_busy_map.get(subject_ids[entry['subject']][1], ())]
+            if conflicts:
+                return None, f"The teacher is already busy for: {'; '.join(conflicts)}"
+
+            timeslot_id_map = timeslot_registry.ids_for(db, sorted({entry['timeslot'] for entry in timetable}))
+            wanted = [(subject_ids[entry['subject']][0], entry['day'], timeslot_id_map[entry['timeslot']])
+                      for entry in timetable]
+            teacher_of = {subject_id: teacher_id for subject_id, teacher_id in subject_ids.values()}
+
+            # Only this semester's rows; the class's other semesters are left alone
+            semester_subject_ids = [subject_id for subject_id, _ in subject_ids.values()]
+            placeholders = ", ".join(["%s"] * len(semester_subject_ids))
+            cursor.execute(f"SELECT timetable_id, subject_id, day, time_id FROM timetable WHERE school_id = %s AND class_id = %s AND subject_id IN ({placeholders})",
+                           (school_id, class_id, *semester_subject_ids))
+            deletes, inserts = _diff_timetable_rows(cursor.fetchall(), wanted)
+
+            cursor.execute("SELECT params FROM generation_run WHERE school_id = %s AND class_id = %s AND semester = %s",
+                           (school_id, class_id, int(semester)))
+            run = cursor.fetchone()
+
+            try:
+                if deletes:
+                    placeholders = ", ".join(["%s"] * len(deletes))
+                    cursor.execute(f"DELETE FROM timetable WHERE timetable_id IN ({placeholders})", tuple(deletes))
+                if inserts:
+                    cursor.executemany(
                         "INSERT INTO timetable (teacher_id, subject_id, class_id, course_id, time_id, day, school_id) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                        (teacher_id, subject_id, class_id, course_id, time_id, entry['day'], school_id)
+                        [(teacher_of[subject_id], subject_id, class_id, course_id, time_id, day, school_id)
+                         for subject_id, day, time_id in inserts]
                     )
-                    saved_timetable.append(entry)
-                except Exception as e:
-                    logging.error(f"Insert Failed: {e}")
-                    # Do not append to saved_timetable if insert failed
-            else:
-                 logging.warning(f"DEBUG: Skipping entry {entry['subject']}: Subject not found in DB for Class {class_id} Sem {semester_int} (Orig: {semester})")
-
-        db.commit()
-        cursor.close()
-        db.close()
-        return saved_timetable, None
+                if run and (deletes or inserts):
+                    # The stored seed no longer reproduces this timetable
+                    params = json.loads(run['params'] or '{}')
+                    params['edited'] = True
+                    score = None
+                    if time_config:
+                        timeslots = list(day_schedule(time_config).timeslots)
+                        teachers = {subject: teacher_id for subject, (_, teacher_id) in subject_ids.items()}
+                        score = score_schedule(timetable, timeslots, params.get('priorities', {}), params.get('rules'),
+                                               teachers, teacher_busy_map)
+                    cursor.execute("UPDATE generation_run SET score = %s, params = %s WHERE school_id = %s AND class_id = %s AND semester = %s",
+                                   (score, json.dumps(params), school_id, class_id, int(semester)))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                cursor.close()
+                if deletes or inserts:
+                    invalidate_occupancy(school_id)
+                    invalidate_school(school_id)
+        return timetable, None
 
     except Exception as e:
         import traceback
@@ -585,6 +906,172 @@ def perform_timetable_generation(class_name, semester, priorities, school_id):
         return None, str(e)
 
 
+def _parse_seed(value):
+    # Optional seed from a request, to replay a recorded generation
+    if value in (None, ''):
+        return None
+    return int(value)
+
+def _set_session_timetable(timetable):
+    # 🔹 The timetable lives in the result store; the session cookie only carries its id
+    session['timetable_id'] = get_result_store().put(timetable, session.get('timetable_id'))
+
+def _session_timetable():
+    result_id = session.get('timetable_id')
+    if not result_id:
+        return []
+    return get_result_store().get(result_id) or []
+
+def _enqueue_generation(class_name, semester, priorities, school_id, seed=None):
+    """
+    Queues a single-class generation as a background job. The session remembers
+    it so the result can be picked up by _collect_pending_job once it is done.
+    """
+    job_id = get_job_queue().submit(perform_timetable_generation, class_name, semester, priorities, school_id,
+                                    time_config=session.get('time_config'), seed=seed, school_id=school_id)
+    session['pending_job'] = job_id
+    return job_id
+
+def _get_own_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None or job['school_id'] != session['school_id']:
+        return None
+    return job
+
+def _collect_pending_job():
+    # Move a finished background generation into the session (worker threads can't write it)
+    job_id = session.get('pending_job')
+    if not job_id:
+        return
+    job = get_job_queue().get(job_id)
+    if job is None:
+        session.pop('pending_job', None)
+    elif job['status'] == DONE:
+        _set_session_timetable(job['result'])
+        session.pop('pending_job', None)
+    elif job['status'] in (FAILED, CANCELLED):
+        session.pop('pending_job', None)
+
+@main_bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job_id == session.get('pending_job'):
+        _collect_pending_job()
+
+    response = {
+        "job_id": job_id,
+        "kind": job['kind'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "error": job['error'],
+    }
+    if job['status'] == DONE:
+        response["result_url"] = url_for('main.job_result', job_id=job_id)
+        if job['kind'] == 'generation':
+            response["redirect"] = "/final_timetable"
+    return jsonify(response)
+
+@main_bp.route('/jobs/<job_id>/result')
+@login_required
+def job_result(job_id):
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] != DONE:
+        return jsonify({"error": f"Job is {job['status']}", "status": job['status']}), 409
+    return jsonify({"job_id": job_id, "result": job['result']})
+
+@main_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not get_job_queue().cancel(job_id):
+        return jsonify({"error": f"Job is already {job['status']}"}), 409
+    return jsonify({"message": "Cancellation requested.", "job_id": job_id})
+
+@main_bp.route('/metrics')
+def prometheus_metrics():
+    """Generation phase timings, search counters, DB pool and cache stats in Prometheus text format."""
+    if Config.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {Config.METRICS_TOKEN}":
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    gauges = {f"timetable_db_pool_{name}": value for name, value in pool_stats().items()}
+    for name, cache in (('timetable', timetable_cache), ('school_id', school_id_cache)):
+        gauges[f"timetable_cache_{name}_hits"] = cache.hits
+        gauges[f"timetable_cache_{name}_misses"] = cache.misses
+    return Response(metrics.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+def _generate_maybe_profiled(profile, class_name, semester, priorities, school_id, **kwargs):
+    """
+    perform_timetable_generation, run under cProfile when the request asked for it
+    and PROFILING_ENABLED is on. Returns ((saved_timetable, error), profile_id or None).
+    """
+    if not (profile and Config.PROFILING_ENABLED):
+        return perform_timetable_generation(class_name, semester, priorities, school_id, **kwargs), None
+    label = f"{class_name} (Sem {semester})"
+    return profile_call(label, school_id, perform_timetable_generation, class_name, semester, priorities, school_id,
+                        **kwargs)
+
+@main_bp.route('/profiles')
+@login_required
+def profiles():
+    """The school's stored generation profiles, newest first."""
+    return jsonify([dict(meta, **{fmt: url_for('main.download_profile', profile_id=meta['id'], format=fmt)
+                                  for fmt in ('pstats', 'txt')})
+                    for meta in list_profiles(session['school_id'])])
+
+@main_bp.route('/profiles/<profile_id>')
+@login_required
+def download_profile(profile_id):
+    fmt = request.args.get('format', 'pstats')
+    path = profile_file(profile_id, session['school_id'], fmt)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if fmt == 'txt':
+        return send_file(path, mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.pstats")
+
+@main_bp.route('/rules', methods=['GET', 'POST'])
+@login_required
+def school_rules():
+    """
+    GET: the school's scheduling rules (merged over the defaults) and the rule definitions.
+    POST: replaces the school's rule settings with the JSON body ({rule: {setting: value}},
+    partial settings keep the defaults); 400 if a rule or value is invalid.
+    """
+    school_id = session['school_id']
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        try:
+            if request.method == 'POST':
+                settings = request.get_json(silent=True)
+                if settings is None:
+                    return jsonify({"error": "Expected a JSON object of rule settings"}), 400
+                try:
+                    rules = resolve_rules(settings)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                cursor.execute("UPDATE schools SET rules = %s WHERE school_id = %s", (json.dumps(settings), school_id))
+                db.commit()
+            else:
+                rules = _school_rules(cursor, school_id)
+        finally:
+            cursor.close()
+    definitions = {name: {'kind': rule['kind'], 'description': rule['description']} for name, rule in RULES.items()}
+    return jsonify({"rules": rules, "definitions": definitions})
+
+@main_bp.route('/db_pool_stats')
+@login_required
+def db_pool_stats():
+    """Connection pool checkouts, waits and timeouts since startup."""
+    return jsonify(pool_stats())
+
 @main_bp.route('/generate', methods=['POST'])
 @login_required
 def generate_timetable():
@@ -593,17 +1080,9 @@ def generate_timetable():
         class_name = data.get('class_name')
         semester = data.get('semester')
         priorities = data.get('priorities', {})
+        seed = _parse_seed(data.get('seed'))
         school_id = session['school_id']
 
-        saved_timetable, error = perform_timetable_generation(class_name, semester, priorities, school_id)
-        
-        if error:
-             return jsonify({"error": error}), 500
-
-        print(f"DEBUG: Finished insertion. Saved {len(saved_timetable)} entries.")
-        
-        session['timetable'] = saved_timetable
-        
         # Save context for regeneration UX
         session['generation_context'] = {
             'class_name': class_name,
@@ -611,7 +1090,63 @@ def generate_timetable():
             'priorities': priorities # Store priorities for quick regenerate
         }
 
-        return jsonify({"message": "Timetable generated successfully!", "redirect": "/final_timetable"})
+        if data.get('async'):
+            job_id = _enqueue_generation(class_name, semester, priorities, school_id, seed=seed)
+            return jsonify({"message": "Timetable generation started.", "job_id": job_id,
+                            "status_url": url_for('main.job_status', job_id=job_id)}), 202
+
+        # 🔹 Per-phase timings and search counters of this request
+        with metrics.request_breakdown() as breakdown, metrics.timer('generation'):
+            (saved_timetable, error), profile_id = _generate_maybe_profiled(
+                data.get('profile'), class_name, semester, priorities, school_id, seed=seed)
+        extra = {"breakdown": breakdown}
+        if profile_id:
+            extra.update(profile_id=profile_id, profile_url=url_for('main.download_profile', profile_id=profile_id))
+        
+        if error:
+             return jsonify({"error": error, **extra}), 500
+
+        logger.debug("Finished insertion. Saved %d entries.", len(saved_timetable))
+        
+        _set_session_timetable(saved_timetable)
+
+        return jsonify({"message": "Timetable generated successfully!", "redirect": "/final_timetable", **extra})
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@main_bp.route('/generate_all', methods=['POST'])
+@login_required
+def generate_all_timetables():
+    try:
+        data = request.json or {}
+        school_id = session['school_id']
+        semester = data.get('semester')
+        priorities = data.get('priorities', {}) # {class_name: {subject: priority}}
+        seed = _parse_seed(data.get('seed'))
+
+        if data.get('async'):
+            job_id = get_job_queue().submit(perform_school_generation, school_id, semester=semester,
+                                            priorities=priorities, time_config=session.get('time_config'),
+                                            seed=seed, kind='school_generation', school_id=school_id)
+            return jsonify({"message": "School timetable generation started.", "job_id": job_id,
+                            "status_url": url_for('main.job_status', job_id=job_id)}), 202
+
+        results, error = perform_school_generation(school_id, semester=semester, priorities=priorities, seed=seed)
+
+        if error:
+            return jsonify({"error": error}), 500
+
+        summary = {
+            class_name: {sem: len(entries) for sem, entries in semesters.items()}
+            for class_name, semesters in results.items()
+        }
+        failed = [f"{class_name} (Sem {sem})" for class_name, semesters in results.items()
+                  for sem, entries in semesters.items() if not entries]
+
+        return jsonify({"message": "School timetables generated successfully!", "classes": summary, "failed": failed})
 
     except Exception as e:
         import traceback
@@ -630,17 +1165,34 @@ def regenerate_quick():
     semester = context.get('semester')
     priorities = context.get('priorities')
     school_id = session['school_id']
+
+    if request.args.get('async'):
+        _enqueue_generation(class_name, semester, priorities, school_id)
+        flash("Regeneration started in the background. Refresh this page to see the new timetable.", "info")
+        return redirect(url_for('main.final_timetable'))
     
-    saved_timetable, error = perform_timetable_generation(class_name, semester, priorities, school_id)
+    (saved_timetable, error), profile_id = _generate_maybe_profiled(request.args.get('profile'), class_name,
+                                                                    semester, priorities, school_id)
+    if profile_id:
+        flash(f"Profile saved: {profile_id}", "info")
     
     if error:
         flash(f"Regeneration failed: {error}", "error")
         return redirect(url_for('main.final_timetable'))
         
-    session['timetable'] = saved_timetable
+    _set_session_timetable(saved_timetable)
     flash("Timetable regenerated successfully!", "success")
     return redirect(url_for('main.final_timetable'))
 
+def _persist_session_edit(updated_timetable):
+    # 🔹 Edits of the generated class timetable also go to the database (public view)
+    context = session.get('generation_context')
+    if 'school_id' not in session or not context:
+        return None
+    _, error = persist_modified_timetable(context.get('class_name'), context.get('semester'), session['school_id'],
+                                          updated_timetable)
+    return error
+
 @main_bp.route('/save_modified_timetable', methods=['POST'])
 def save_modified_timetable():
     try:
@@ -650,13 +1202,11 @@ def save_modified_timetable():
         if not updated_timetable:
             return jsonify({"error": "Timetable data is missing"}), 400
 
-        session['timetable'] = updated_timetable  # Save in session
-        
-        # NOTE: Ideally we should update the DB here too, but for now we keep session persistent for immediate modifications.
-        # If user wants permanent modifications to stick, we'd need another DB update logic here.
-        # For 'view timetable', it will pull the *initial* generated one unless we update DB here.
-        # Let's assume for now the user wants to fetch the generated one. 
-        # If they modify, it's currently only in session. The user didn't explicitly ask for modification persistence, just 'view' persistence.
+        error = _persist_session_edit(updated_timetable)
+        if error:
+            return jsonify({"error": error}), 400
+
+        _set_session_timetable(updated_timetable)
 
         return jsonify({"message": "Timetable updated successfully!", "redirect": "/final_timetable"})
 
@@ -666,7 +1216,9 @@ def save_modified_timetable():
 
 @main_bp.route('/final_timetable')
 def final_timetable():
-    timetable_data = session.get('timetable', [])
+    if 'school_id' in session:
+        _collect_pending_job()
+    timetable_data = _session_timetable()
     context = session.get('generation_context', {})
     
     structured_timetable = {}
@@ -681,7 +1233,7 @@ def final_timetable():
     # Visualization Slots
     time_config = session.get('time_config')
     if time_config:
-         visual_slots = get_daily_slots(time_config, include_break=True)
+         visual_slots = day_schedule(time_config).visual_slots()
     else:
          visual_slots = [{'time': slot, 'type': 'lecture'} for slot in sorted(set(entry['timeslot'] for entry in timetable_data))]
 
@@ -694,15 +1246,12 @@ def final_timetable():
 @main_bp.route('/modify_timetable', methods=['GET', 'POST'])
 def modify_timetable():
     if request.method == 'GET':
-        timetable = session.get('timetable', [])
+        timetable = _session_timetable()
         # modify_timetable also needs to know about full slots ideally?
         # For now keep it simple, it loads just lecture slots usually.
         
-        db = connect_db()
-        cursor = db.cursor()
-        cursor.execute("SELECT timeslot FROM timeslot")
-        timeslots = [str(row[0]) for row in cursor.fetchall()]
-        db.close()
+        with db_connection() as db:
+            timeslots = timeslot_registry.all_times(db)
 
         return render_template("modify_timetable.html", timetable=timetable, timeslots=timeslots)
 
@@ -714,7 +1263,11 @@ def modify_timetable():
             if not updated_timetable:
                 return jsonify({"error": "Timetable data is missing"}), 400
 
-            session['timetable'] = updated_timetable  
+            error = _persist_session_edit(updated_timetable)
+            if error:
+                return jsonify({"error": error}), 400
+
+            _set_session_timetable(updated_timetable)
 
             return jsonify({"message": "Timetable updated successfully!", "redirect": "/final_timetable"})
 
@@ -725,6 +1278,51 @@ def modify_timetable():
 def view_timetable():
     return render_template("view_timetable.html")
 
+def _resolve_school_id(school_username):
+    school_id = school_id_cache.get(school_username)
+    if school_id is None:
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True)
+            cursor.execute("SELECT school_id FROM schools WHERE username = %s", (school_username,))
+            school = cursor.fetchone()
+        if not school:
+            return None
+        school_id = school['school_id']
+        school_id_cache.set(school_username, school_id)
+    return school_id
+
+def _load_public_timetable(school_id, class_name, semester):
+    """
+    Builds the /get_timetable payload from the database alone (stored timetable and
+    the school's own day layout) so it can be shared by every viewer.
+    Returns (etag, json_body), or None when the class has no stored timetable.
+    """
+    timetable_db, timeslots_list = get_timetable_by_class(class_name, semester, school_id)
+    if not timetable_db:
+        return None
+
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM schools WHERE school_id = %s", (school_id,))
+        school_config = cursor.fetchone()
+
+    if school_config:
+        # Construct minimal config object
+        time_config = {
+            'start_time': str(school_config['start_time']),
+            'end_time': str(school_config['end_time']),
+            'lecture_duration': school_config['lecture_duration'],
+            'break_start': str(school_config['break_start_time']) if school_config['break_start_time'] else None,
+            'break_duration': school_config['break_duration']
+        }
+        visual_slots = day_schedule(time_config).visual_slots()
+    else:
+        # Just map the raw strings to objects
+        visual_slots = [{'time': t, 'type': 'lecture'} for t in timeslots_list]
+
+    body = json.dumps({"timetable": timetable_db, "visual_slots": visual_slots})
+    return hashlib.sha1(body.encode()).hexdigest(), body
+
 @main_bp.route('/get_timetable', methods=['GET'])
 def get_timetable():
     try:
@@ -736,15 +1334,8 @@ def get_timetable():
         school_id = None
         
         if school_username:
-             db = connect_db()
-             cursor = db.cursor(dictionary=True)
-             cursor.execute("SELECT school_id FROM schools WHERE username = %s", (school_username,))
-             school = cursor.fetchone()
-             db.close()
-             
-             if school:
-                 school_id = school['school_id']
-             else:
+             school_id = _resolve_school_id(school_username)
+             if not school_id:
                  return jsonify({"error": "School not found. Please check the username."}), 404
         
         # Fallback to session if available (Admin viewing)
@@ -758,50 +1349,36 @@ def get_timetable():
         if not class_name or not semester:
             return jsonify({"error": "Missing class name or semester"}), 400
 
-        # Try fetching from DB first
-        timetable_db, timeslots_list = get_timetable_by_class(class_name, semester, school_id)
-        
-        # If we have time_config in session (and checks pass), use it for better visualization?
-        # For public access, we don't have session['time_config'].
-        # We should fetch time config for the school from DB if possible, or just rely on DB slots.
-        
-        visual_slots = []
-        time_config = session.get('time_config')
-        
-        if not time_config and school_id:
-             # Fetch config from DB for public view
-             db = connect_db()
-             cursor = db.cursor(dictionary=True)
-             cursor.execute("SELECT * FROM schools WHERE school_id = %s", (school_id,))
-             school_config = cursor.fetchone()
-             db.close()
-             
-             if school_config:
-                 # Construct minimal config object
-                 time_config = {
-                    'start_time': str(school_config['start_time']),
-                    'end_time': str(school_config['end_time']),
-                    'lecture_duration': school_config['lecture_duration'],
-                    'break_start': str(school_config['break_start_time']) if school_config['break_start_time'] else None,
-                    'break_duration': school_config['break_duration']
-                 }
-
-        if time_config:
-             # Assume this config applies to what we are viewing
-             visual_slots = get_daily_slots(time_config, include_break=True)
-        else:
-             # Just map the raw strings to objects
-             visual_slots = [{'time': t, 'type': 'lecture'} for t in timeslots_list]
-
-        if timetable_db:
-             return jsonify({"timetable": timetable_db, "visual_slots": visual_slots})
+        # 🔹 Stored timetables are served from the read-through cache
+        key = (school_id, class_name, str(semester))
+        cached = timetable_cache.get(key)
+        if cached is None:
+            cached = _load_public_timetable(school_id, class_name, semester)
+            if cached is not None:
+                timetable_cache.set(key, cached)
+
+        if cached is not None:
+            etag, body = cached
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
 
         # Fallback to session (Only if logged in / admin viewing own generation)
-        # Students won't have session['timetable']
-        timetable_data = session.get('timetable', [])
+        # Students won't have a session timetable
+        timetable_data = _session_timetable()
         if not timetable_data:
             return jsonify({"error": "No timetable found for this class."}), 404
 
+        time_config = session.get('time_config')
+        if time_config:
+             visual_slots = day_schedule(time_config).visual_slots()
+        else:
+             visual_slots = [{'time': t, 'type': 'lecture'} for t in sorted(set(e['timeslot'] for e in timetable_data))]
+
         structured_timetable = {}
         for entry in timetable_data:
             day = entry['day']
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.logic.config import Config
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after being set.
+    The TTL bounds how stale an entry can get when another worker process writes.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        """Drops every entry whose key matches predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 🔹 Public /get_timetable responses: (school_id, class_name, semester) -> (etag, json_body)
+timetable_cache = LRUCache(Config.TIMETABLE_CACHE_SIZE, Config.TIMETABLE_CACHE_TTL)
+# School username -> school_id for the same endpoint
+school_id_cache = LRUCache(Config.TIMETABLE_CACHE_SIZE, Config.TIMETABLE_CACHE_TTL)
+
+
+def invalidate_school(school_id):
+    """Call after anything a school's published timetables show has changed."""
+    timetable_cache.invalidate(lambda key: key[0] == school_id)
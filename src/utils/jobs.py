@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.logic.config import Config
+from src.utils.stores import MemoryStore, SQLiteStore, open_store
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Minimum seconds between two progress writes / cancellation checks of a running job
+_PROGRESS_INTERVAL = 0.2
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _new_job(job_id, kind, school_id):
+    now = time.time()
+    return {
+        'id': job_id,
+        'kind': kind,
+        'school_id': school_id,
+        'status': QUEUED,
+        'progress': {},
+        'result': None,
+        'error': None,
+        'cancel_requested': False,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+class MemoryJobStore(MemoryStore):
+    """
+    Keeps jobs in a dict. Finished jobs are dropped ttl seconds after their last update.
+    """
+
+    def _expired(self, job, now):
+        return job['status'] in FINISHED and now - job['updated_at'] > self.ttl
+
+    def create(self, job):
+        with self._lock:
+            self._purge(time.time())
+            self._items[job['id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._items.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._items.get(job_id)
+            return dict(job) if job is not None else None
+
+
+class SQLiteJobStore(SQLiteStore):
+    """
+    Keeps jobs in a local SQLite file so every worker process of the app can poll
+    and cancel them. Progress and results are stored as JSON.
+    Finished jobs are dropped ttl seconds after their last update.
+    """
+
+    _JSON_FIELDS = ('progress', 'result')
+    table = 'jobs'
+    schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            school_id INTEGER,
+            status TEXT,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER,
+            created_at REAL,
+            updated_at REAL
+        )
+    """
+    expired = f"status IN ({', '.join(repr(status) for status in FINISHED)}) AND updated_at < ?"
+
+    def create(self, job):
+        row = {k: json.dumps(v) if k in self._JSON_FIELDS else v for k, v in job.items()}
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._connect() as conn:
+            self._purge(conn, time.time())
+            conn.execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", tuple(row.values()))
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        row = {k: json.dumps(v) if k in self._JSON_FIELDS else v for k, v in fields.items()}
+        assignments = ", ".join(f"{k} = ?" for k in row)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*row.values(), job_id))
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for k in self._JSON_FIELDS:
+            job[k] = json.loads(job[k]) if job[k] is not None else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+
+class JobQueue:
+    """
+    Runs generation jobs on an in-process thread pool and records their status,
+    progress and result in a job store.
+    """
+
+    def __init__(self, store, workers):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='timetable-job')
+
+    def submit(self, fn, *args, kind='generation', school_id=None, **kwargs):
+        """
+        Queues fn(*args, progress=callback, **kwargs). fn follows the
+        (result, error_message) convention of perform_timetable_generation.
+        Returns the job id.
+        """
+        job_id = uuid.uuid4().hex
+        self.store.create(_new_job(job_id, kind, school_id))
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        job = self.store.get(job_id)
+        if job is None or job['cancel_requested']:
+            self.store.update(job_id, status=CANCELLED)
+            return
+
+        self.store.update(job_id, status=RUNNING)
+        last_report = [0.0]
+
+        def progress(generation, best_score, **info):
+            now = time.monotonic()
+            if now - last_report[0] < _PROGRESS_INTERVAL:
+                return
+            last_report[0] = now
+            if self.store.get(job_id)['cancel_requested']:
+                raise JobCancelled()
+            self.store.update(job_id, progress=dict(info, generation=generation, best_score=int(best_score)))
+
+        try:
+            result, error = fn(*args, progress=progress, **kwargs)
+        except JobCancelled:
+            self.store.update(job_id, status=CANCELLED)
+            return
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e))
+            return
+
+        if error:
+            self.store.update(job_id, status=FAILED, error=error)
+        else:
+            self.store.update(job_id, status=DONE, result=result)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Asks a job to stop. Queued jobs never start; running ones stop at their next
+        progress report.
+        """
+        job = self.store.get(job_id)
+        if job is None or job['status'] in FINISHED:
+            return False
+        self.store.update(job_id, cancel_requested=True)
+        return True
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            store = open_store(Config.JOB_STORE_PATH, Config.JOB_TTL, MemoryJobStore, SQLiteJobStore)
+            _queue = JobQueue(store, Config.JOB_WORKERS)
+        return _queue
@@ -0,0 +1,86 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide totals since startup: phase -> [count, seconds] and counter -> value
+_timings = {}
+_counters = {}
+_lock = threading.Lock()
+
+# Breakdown of the request being served, if one is being collected (see request_breakdown)
+_current = contextvars.ContextVar('metrics_breakdown', default=None)
+
+
+def add_time(phase, seconds, count=1):
+    """Adds `seconds` spent in `phase` to the totals and to the current breakdown."""
+    with _lock:
+        entry = _timings.setdefault(phase, [0, 0.0])
+        entry[0] += count
+        entry[1] += seconds
+    breakdown = _current.get()
+    if breakdown is not None:
+        timings = breakdown['timings_ms']
+        timings[phase] = timings.get(phase, 0.0) + seconds * 1000.0
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+    breakdown = _current.get()
+    if breakdown is not None:
+        counters = breakdown['counters']
+        counters[name] = counters.get(name, 0) + value
+
+
+@contextmanager
+def timer(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase, time.perf_counter() - started)
+
+
+@contextmanager
+def request_breakdown():
+    """
+    Collects the timings (ms per phase) and counters recorded by this thread while
+    the block runs, e.g. to return them with a /generate response.
+    Yields {'timings_ms': {...}, 'counters': {...}}.
+    """
+    breakdown = {'timings_ms': {}, 'counters': {}}
+    token = _current.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _current.reset(token)
+        breakdown['timings_ms'] = {phase: round(ms, 3) for phase, ms in breakdown['timings_ms'].items()}
+
+
+def snapshot():
+    with _lock:
+        return ({phase: tuple(entry) for phase, entry in _timings.items()}, dict(_counters))
+
+
+def render_prometheus(gauges=None):
+    """
+    Prometheus text format of the totals, plus `gauges` ({metric_name: value}).
+    Time spent inside worker processes (GENERATION_WORKERS > 1) is only counted
+    as part of the 'engine' phase; their attempt counters are included.
+    """
+    timings, counters = snapshot()
+    lines = [
+        "# HELP timetable_phase_seconds Time spent per generation phase.",
+        "# TYPE timetable_phase_seconds summary",
+    ]
+    for phase, (count, seconds) in sorted(timings.items()):
+        lines.append(f'timetable_phase_seconds_sum{{phase="{phase}"}} {seconds:.6f}')
+        lines.append(f'timetable_phase_seconds_count{{phase="{phase}"}} {count}')
+    for name, value in sorted(counters.items()):
+        lines.append(f"# TYPE timetable_{name}_total counter")
+        lines.append(f"timetable_{name}_total {value}")
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,103 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+from src.logic.config import Config
+
+# Downloadable files per profile: binary pstats (for pstats / snakeviz) and a text report
+FORMATS = ('pstats', 'txt')
+_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-\d+-[0-9a-f]{8}$')
+
+# cProfile can only run one profile at a time in the process
+_profile_lock = threading.Lock()
+
+
+def _path(profile_id, ext):
+    return os.path.join(Config.PROFILE_DIR, f"{profile_id}.{ext}")
+
+
+def profile_call(label, school_id, fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) under cProfile and saves the profile to PROFILE_DIR,
+    keeping only the newest PROFILE_KEEP profiles.
+    Returns (result, profile_id); profile_id is None when another profile was
+    already running (fn then runs without profiling).
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return fn(*args, **kwargs), None
+    try:
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - started
+    finally:
+        _profile_lock.release()
+
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(school_id)}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(_path(profile_id, 'pstats'))
+
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(60)
+    with open(_path(profile_id, 'txt'), 'w') as f:
+        f.write(report.getvalue())
+
+    meta = {'id': profile_id, 'label': label, 'school_id': school_id, 'seconds': round(seconds, 4),
+            'created_at': time.time()}
+    with open(_path(profile_id, 'json'), 'w') as f:
+        json.dump(meta, f)
+
+    _trim()
+    return result, profile_id
+
+
+def _stored_profiles():
+    # Metadata of every stored profile, oldest first
+    if not os.path.isdir(Config.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(Config.PROFILE_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(Config.PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta.get('created_at', 0))
+
+
+def _trim():
+    # Ring buffer: drop the oldest profiles beyond PROFILE_KEEP
+    profiles = _stored_profiles()
+    for meta in profiles[:max(len(profiles) - Config.PROFILE_KEEP, 0)]:
+        for ext in FORMATS + ('json',):
+            try:
+                os.remove(_path(meta['id'], ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(school_id):
+    """Metadata of the school's stored profiles, newest first."""
+    return [meta for meta in reversed(_stored_profiles()) if meta.get('school_id') == school_id]
+
+
+def profile_file(profile_id, school_id, fmt):
+    """Path of one stored profile file, or None if it isn't the school's or doesn't exist."""
+    if fmt not in FORMATS or not _ID_PATTERN.match(profile_id):
+        return None
+    if profile_id.split('-')[2] != str(school_id):
+        return None
+    path = os.path.abspath(_path(profile_id, fmt))
+    return path if os.path.exists(path) else None
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+import uuid
+
+from src.logic.config import Config
+from src.utils.stores import MemoryStore, SQLiteStore, open_store
+
+
+class MemoryResultStore(MemoryStore):
+    """
+    Keeps timetables in a dict, as (timetable, stored_at).
+    """
+
+    def _expired(self, item, now):
+        return now - item[1] > self.ttl
+
+    def put(self, timetable, result_id=None):
+        result_id = result_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._items[result_id] = (list(timetable), now)
+        return result_id
+
+    def get(self, result_id):
+        with self._lock:
+            entry = self._items.get(result_id)
+        if entry is None or self._expired(entry, time.time()):
+            return None
+        return list(entry[0])
+
+    def delete(self, result_id):
+        with self._lock:
+            self._items.pop(result_id, None)
+
+
+class SQLiteResultStore(SQLiteStore):
+    """
+    Keeps timetables as JSON in a local SQLite file.
+    """
+
+    table = 'results'
+    schema = """
+        CREATE TABLE IF NOT EXISTS results (
+            id TEXT PRIMARY KEY,
+            timetable TEXT,
+            stored_at REAL
+        )
+    """
+    expired = "stored_at < ?"
+
+    def put(self, timetable, result_id=None):
+        result_id = result_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            self._purge(conn, now)
+            conn.execute("INSERT OR REPLACE INTO results (id, timetable, stored_at) VALUES (?, ?, ?)",
+                         (result_id, json.dumps(timetable), now))
+        return result_id
+
+    def get(self, result_id):
+        row = self._connect().execute("SELECT timetable FROM results WHERE id = ? AND stored_at >= ?",
+                                      (result_id, time.time() - self.ttl)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def delete(self, result_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE id = ?", (result_id,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_store(Config.RESULT_STORE_PATH, Config.RESULT_TTL, MemoryResultStore, SQLiteResultStore)
+        return _store
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import threading
+
+
+class MemoryStore:
+    """
+    Base of the in-process stores (jobs, results): a dict behind a lock, only
+    visible to the process that created it. Subclasses say when an item has
+    expired; expired items are purged on every write.
+    """
+
+    shared = False
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, item, now):
+        raise NotImplementedError
+
+    def _purge(self, now):
+        # Call with self._lock held
+        for key in [k for k, item in self._items.items() if self._expired(item, now)]:
+            del self._items[key]
+
+
+class SQLiteStore:
+    """
+    Base of the stores kept in a local SQLite file, shared by every worker process
+    of the app: one connection per thread, the file's directory created if needed.
+    Subclasses set `table`, `schema` (its CREATE TABLE IF NOT EXISTS) and `expired`,
+    a WHERE condition on the cutoff time (now - ttl, the only parameter); matching
+    rows are purged on every write.
+    """
+
+    shared = True
+    table = None
+    schema = None
+    expired = None
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(self.schema)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _purge(self, conn, now):
+        conn.execute(f"DELETE FROM {self.table} WHERE {self.expired}", (now - self.ttl,))
+
+
+def open_store(path, ttl, memory_store, sqlite_store):
+    """memory_store(ttl) when path is 'memory', otherwise sqlite_store(path, ttl)."""
+    if path == 'memory':
+        return memory_store(ttl)
+    return sqlite_store(path, ttl)
@@ -0,0 +1,73 @@
+import random
+from array import array
+
+import pytest
+
+from src.logic.algorithms import calculate_distribution_score
+from src.logic.encoding import DAYS, EMPTY, ScheduleEncoding
+from src.logic.fitness import batch_scores
+from src.logic.model import get_high_priority_subjects
+from src.logic.rules import Objective, resolve_rules
+
+TIMESLOTS = ['09:00:00', '10:00:00', '11:00:00', '13:00:00', '14:00:00', '15:00:00']
+
+
+def _objective(subjects, timeslots, priorities):
+    encoding = ScheduleEncoding(subjects, timeslots, priorities, get_high_priority_subjects(priorities))
+    return Objective(encoding, resolve_rules(None))
+
+
+def _assert_parity(objective, grids, priorities):
+    """Objective.score, batch_scores and the reference scorer agree on every grid."""
+    encoding = objective.encoding
+    expected = [calculate_distribution_score(encoding.decode(grid), encoding.timeslots, priorities) for grid in grids]
+    assert [objective.score(grid) for grid in grids] == expected
+    assert batch_scores(encoding.to_numpy(grids), objective).tolist() == expected
+
+
+def _random_grid(rng, encoding, density):
+    return array('h', [rng.randrange(encoding.n_subjects) if rng.random() < density else EMPTY
+                       for _ in range(encoding.size)])
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_random_grids(seed):
+    rng = random.Random(seed)
+    subjects = [f"S{i}" for i in range(rng.randint(1, 8))]
+    priorities = {s: rng.randint(1, 5) for s in subjects}
+    objective = _objective(subjects, TIMESLOTS, priorities)
+    grids = [_random_grid(rng, objective.encoding, density) for density in (0.2, 0.5, 0.8, 1.0)]
+    _assert_parity(objective, grids, priorities)
+
+
+def test_empty_grid():
+    priorities = {'Math': 5, 'Art': 1}
+    objective = _objective(list(priorities), TIMESLOTS, priorities)
+    _assert_parity(objective, [objective.encoding.empty()], priorities)
+
+
+def test_single_slot():
+    rng = random.Random(1)
+    priorities = {'Math': 5, 'Art': 2, 'Music': 1}
+    objective = _objective(list(priorities), ['09:00:00'], priorities)
+    grids = [_random_grid(rng, objective.encoding, density) for density in (0.0, 0.5, 1.0)]
+    _assert_parity(objective, grids, priorities)
+
+
+def test_no_priorities():
+    rng = random.Random(2)
+    subjects = ['Math', 'Art', 'Music', 'Physics']
+    objective = _objective(subjects, TIMESLOTS, {})
+    grids = [_random_grid(rng, objective.encoding, density) for density in (0.3, 0.9)]
+    _assert_parity(objective, grids, {})
+
+
+def test_over_daily_limit():
+    # Math four times on Monday (limit 2), once split by another subject
+    priorities = {'Math': 5, 'Art': 1}
+    objective = _objective(list(priorities), TIMESLOTS, priorities)
+    encoding = objective.encoding
+    schedule = [{'day': 'Monday', 'timeslot': t, 'subject': s}
+                for t, s in zip(TIMESLOTS, ['Math', 'Math', 'Art', 'Math', 'Math', 'Art'])]
+    schedule += [{'day': day, 'timeslot': TIMESLOTS[0], 'subject': 'Art'} for day in DAYS[1:]]
+    _assert_parity(objective, [encoding.encode(schedule)], priorities)
@@ -0,0 +1,49 @@
+import random
+from array import array
+
+import pytest
+
+from src.logic.encoding import EMPTY, ScheduleEncoding
+from src.logic.fitness import IncrementalScore
+from src.logic.model import get_high_priority_subjects
+from src.logic.rules import Objective, resolve_rules
+
+TIMESLOTS = ['09:00:00', '10:00:00', '11:00:00', '13:00:00', '14:00:00', '15:00:00']
+SUBJECTS = ['Math', 'Physics', 'Art', 'Music', 'History']
+PRIORITIES = {'Math': 5, 'Physics': 4, 'Art': 2, 'Music': 1}
+
+TEACHER_RULES = {
+    'teacher_consecutive': {'enabled': True, 'max': 2, 'weight': 40},
+    'preferred_days': {'enabled': True, 'weight': 15, 'subjects': {'Math': ['Monday', 'Tuesday'], 'Art': ['Friday']}},
+}
+# Math and Physics share a teacher who already teaches another class on Monday morning
+TEACHERS = {'Math': 0, 'Physics': 0, 'Art': 1, 'Music': 2, 'History': 1}
+TEACHER_BUSY = {0: {('Monday', '09:00:00'), ('Monday', '10:00:00')}, 1: {('Wednesday', '14:00:00')}}
+
+
+def _objective(rules, teachers=None, teacher_busy=None):
+    encoding = ScheduleEncoding(SUBJECTS, TIMESLOTS, PRIORITIES, get_high_priority_subjects(PRIORITIES))
+    return Objective(encoding, resolve_rules(rules), teachers, teacher_busy)
+
+
+@pytest.mark.parametrize('rules, teachers, teacher_busy', [
+    (None, None, None),
+    (TEACHER_RULES, TEACHERS, TEACHER_BUSY),
+], ids=['default', 'teacher_consecutive+preferred_days'])
+@pytest.mark.parametrize('seed', range(4))
+def test_swaps_keep_score_exact(seed, rules, teachers, teacher_busy):
+    rng = random.Random(seed)
+    objective = _objective(rules, teachers, teacher_busy)
+    encoding = objective.encoding
+    grid = array('h', [rng.randrange(encoding.n_subjects) if rng.random() < 0.6 else EMPTY
+                       for _ in range(encoding.size)])
+    inc = IncrementalScore(grid, objective)
+    assert inc.score == objective.score(inc.grid)
+
+    for _ in range(500):
+        c1, c2 = rng.randrange(encoding.size), rng.randrange(encoding.size)
+        expected = inc.swap_delta(c1, c2)
+        before = inc.score
+        assert inc.swap(c1, c2) == expected
+        assert inc.score == before + expected
+        assert inc.score == objective.score(inc.grid)